@@ -1,26 +1,102 @@
-import os
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-from werkzeug.utils import secure_filename
+import time
+
+BOOT_STARTED = time.perf_counter()
+
+import io
+import json
+import base64
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, g
+from utils import config
+from utils.admission import Overloaded, client_connected
+from utils.jobs import JobQueue
+from utils.metrics import REGISTRY, REQUEST_SECONDS, stage
 from utils.predictor import predictor
+from utils.preprocess import thumbnail_jpeg
+from utils.uploads import UploadStore
 
 app = Flask(__name__)
 
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+THUMBNAIL_SIZE = 480  # longest side of the specimen shown on the result page
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+upload_store = UploadStore(UPLOAD_FOLDER, config.UPLOAD_MAX_FILES) if config.SAVE_UPLOADS else None
+
+job_queue = JobQueue(config.JOBS_DB_PATH, predictor,
+                     workers=config.JOB_WORKERS,
+                     retention_seconds=config.JOB_RETENTION_SECONDS)
+job_queue.start()
+REGISTRY.callback('drcrop_jobs_pending', 'Queued or running prediction jobs', 'gauge',
+                  lambda: [({}, job_queue.queue_depth())])
+
+print(f"App imported in {(time.perf_counter() - BOOT_STARTED) * 1000:.1f} ms "
+      f"(model: {predictor.state})", flush=True)
+
+def model_unavailable():
+    # 503 + Retry-After while the model is still loading / warming up
+    response = jsonify({'error': 'Model not ready', 'state': predictor.state})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+def overloaded(e):
+    # Shed by admission control: fail fast so clients / the load balancer retry
+    response = jsonify({'error': 'Server busy, retry later', 'reason': e.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def wants_json():
+    # API clients send JSON or ask for it; the upload form gets HTML pages
+    if request.headers.get('Content-Type') == 'application/json':
+        return True
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    # Streaming responses are measured to the first byte
+    if request.url_rule is not None and 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                route=request.url_rule.rule, status=response.status_code)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving HTTP
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: model loaded and warmed up
+    body = {
+        'state': predictor.state,
+        'model_version': predictor.model_version,
+        'boot_timings_ms': dict(predictor.boot_timings),
+    }
+    return jsonify(body), 200 if predictor.is_ready else 503
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/predict', methods=['POST'])
 def predict():
+    if not predictor.is_ready:
+        return model_unavailable()
+
     if 'file' not in request.files:
         if request.headers.get('Content-Type') == 'application/json':
              return jsonify({'error': 'No file part'}), 400
@@ -34,32 +110,200 @@ def predict():
         return redirect(request.url)
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+        # Decode straight from memory; the hot path never touches the disk
+        with stage('upload_read'):
+            data = file.read()
+        extension = file.filename.rsplit('.', 1)[1].lower()
+
         # Get full result from professional predictor
-        result = predictor.predict(filepath)
-        
+        try:
+            result = predictor.predict_bytes(
+                data, alive=client_connected(request.environ.get('gunicorn.socket')),
+                thumbnail=THUMBNAIL_SIZE)
+        except Overloaded as e:
+            return overloaded(e)
+
+        if "quality" in result and "error" in result:
+            # rejected by the quality gate: tell the user how to retake it
+            if wants_json():
+                return jsonify(result), 422
+            return render_template('index.html', quality_feedback=result['quality']['feedback']), 422
+
         if "error" in result:
              return result["error"], 500
 
+        if upload_store is not None:
+            upload_store.save_async(data, extension)
+
+        # Show the specimen inline so the page does not depend on the
+        # (optional, asynchronous) copy on disk, as a small re-encoded
+        # thumbnail rather than the multi-megabyte upload. It is made from
+        # the prediction's own decode; only cache hits decode again.
+        thumbnail = result.get('thumbnail')
+        if thumbnail is None:
+            try:
+                thumbnail = thumbnail_jpeg(io.BytesIO(data), THUMBNAIL_SIZE)
+            except Exception as e:
+                # display only: the diagnosis is still shown
+                print(f"Thumbnail error: {e}", flush=True)
+        filepath = f"data:image/jpeg;base64,{base64.b64encode(thumbnail).decode('ascii')}" if thumbnail else None
+
         # Pass all fields to template
-        return render_template('result.html', 
-                               image_path=filepath,
-                               disease=result['disease_name'],
-                               crop=result['crop'],
-                               risk_level=result['risk_level'],
-                               confidence=result['confidence'],
-                               confidence_score=result['confidence_score'],
-                               confidence_level=result['confidence_level'],
-                               confidence_class=result['confidence_class'],
-                               description=result['description'],
-                               causes=result['causes'],
-                               treatment=result['treatment'],
-                               prevention=result['prevention'])
+        with stage('render'):
+            return render_template('result.html',
+                                   image_path=filepath,
+                                   disease=result['disease_name'],
+                                   crop=result['crop'],
+                                   risk_level=result['risk_level'],
+                                   confidence=result['confidence'],
+                                   confidence_score=result['confidence_score'],
+                                   confidence_level=result['confidence_level'],
+                                   confidence_class=result['confidence_class'],
+                                   description=result['description'],
+                                   causes=result['causes'],
+                                   treatment=result['treatment'],
+                                   prevention=result['prevention'],
+                                   quality_feedback=result.get('quality', {}).get('feedback', []))
 
     return redirect(request.url)
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    if not predictor.is_ready:
+        return model_unavailable()
+
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+
+    if len(files) > config.BATCH_MAX_FILES:
+        return jsonify({'error': f'Too many files (max {config.BATCH_MAX_FILES})'}), 413
+
+    # Read everything up front: the response body is produced after the
+    # request stream has been consumed.
+    names = [f.filename for f in files]
+    uploads = []
+    rejected = {}
+    for index, f in enumerate(files):
+        if allowed_file(f.filename):
+            uploads.append((index, f.read()))
+        else:
+            rejected[index] = {'error': 'File type not allowed'}
+
+    # the whole batch is admitted (or refused) up front; its queue slots are
+    # released when the server closes the stream, finished or not
+    try:
+        predictor.admission.acquire(len(uploads))
+    except Overloaded as e:
+        return overloaded(e)
+
+    def generate():
+        for index, result in rejected.items():
+            yield json.dumps({'index': index, 'filename': names[index], **result}) + '\n'
+
+        results = predictor.predict_stream([data for _, data in uploads])
+        for position, result in results:
+            index = uploads[position][0]
+            yield json.dumps({'index': index, 'filename': names[index], **result}) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(lambda: predictor.admission.release(len(uploads)))
+    return response
+
+@app.route('/predict/tiled', methods=['POST'])
+def predict_tiled():
+    # Large field / drone photos: per-tile disease map + aggregated diagnosis
+    if not predictor.is_ready:
+        return model_unavailable()
+
+    file = request.files.get('file')
+    if not file or not file.filename or not allowed_file(file.filename):
+        return jsonify({'error': 'No valid file uploaded'}), 400
+
+    stride = request.args.get('stride', type=int)
+    tile = predictor.active.input_shape[0]
+    if stride is not None and not 0 < stride <= tile:
+        # a wider step would leave strips of the image unclassified
+        return jsonify({'error': f'stride must be between 1 and the tile size ({tile})'}), 400
+
+    # every tile is a forward pass: admit the request for as many images as
+    # it will classify, counted from the header before anything is decoded
+    try:
+        tiles = predictor.count_tiles(file.stream, stride=stride)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception:
+        return jsonify({'error': 'Unreadable image'}), 400
+
+    try:
+        with predictor.admission.admit(tiles) as deadline:
+            result = predictor.predict_tiled(
+                file.stream, stride=stride, deadline=deadline,
+                alive=client_connected(request.environ.get('gunicorn.socket')))
+    except Overloaded as e:
+        return overloaded(e)
+    if 'error' in result:
+        return jsonify(result), 500
+    return jsonify(result)
+
+@app.route('/predict/similar', methods=['POST'])
+def predict_similar():
+    # Diagnosis plus the most similar past cases for agronomist review
+    if predictor.embeddings is None:
+        return jsonify({'error': 'Embedding store disabled (DRCROP_EMBEDDINGS=1)'}), 404
+    if not predictor.is_ready:
+        return model_unavailable()
+
+    file = request.files.get('file')
+    if not file or not file.filename or not allowed_file(file.filename):
+        return jsonify({'error': 'No valid file uploaded'}), 400
+
+    k = request.args.get('k', 10, type=int)
+    if not 1 <= k <= config.SIMILAR_MAX_K:
+        return jsonify({'error': f'k must be between 1 and {config.SIMILAR_MAX_K}'}), 400
+
+    try:
+        result = predictor.find_similar(
+            file.read(), k=k,
+            alive=client_connected(request.environ.get('gunicorn.socket')),
+            return_embedding=request.args.get('embedding') == '1')
+    except Overloaded as e:
+        return overloaded(e)
+    if 'error' in result:
+        return jsonify(result), 422 if 'quality' in result else 500
+    return jsonify(result)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file')
+             if f and f.filename]
+
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+
+    if len(files) > config.BATCH_MAX_FILES:
+        return jsonify({'error': f'Too many files (max {config.BATCH_MAX_FILES})'}), 413
+
+    rejected = [f.filename for f in files if not allowed_file(f.filename)]
+    if rejected:
+        return jsonify({'error': 'File type not allowed', 'files': rejected}), 400
+
+    job_id = job_queue.submit([(f.filename, f.read()) for f in files])
+    status_url = url_for('get_job', job_id=job_id)
+    response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    # ?wait=N long-polls up to N seconds for the job to finish
+    wait = min(request.args.get('wait', 0, type=float), config.JOB_MAX_WAIT_SECONDS)
+    job = job_queue.get(job_id, wait=max(wait, 0))
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,383 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+# Benchmarks must measure real inference: disable result reuse before the
+# predictor is imported (explicit env settings still win).
+os.environ.setdefault("DRCROP_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("DRCROP_NEAR_DUP_CAPACITY", "0")
+os.environ.setdefault("DRCROP_QUALITY_GATE", "off")
+
+import numpy as np
+from PIL import Image
+
+from utils import config
+from utils.preprocess import preprocess_image
+
+RESOLUTIONS = ['640x480', '1920x1080', '4000x3000']
+BATCH_SIZES = [1, 4, 16, 32]
+CONCURRENCY = [1, 4, 8]
+INPUT_SIZES = [96, 128, 160, 224]
+INDEX_SIZES = [100_000, 1_000_000]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """A leaf-ish green gradient with noise, so JPEG sizes look like photos."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        60 + 40 * np.sin(x / 97.0),
+        140 + 60 * np.cos(y / 131.0),
+        50 + 30 * np.sin((x + y) / 173.0),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def summarize(name, latencies, images, wall_time, **params):
+    ms = np.asarray(latencies) * 1000
+    result = {
+        'name': name,
+        **params,
+        'requests': len(latencies),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'images_per_sec': round(images / wall_time, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    print(f"{name:<12} {json.dumps(params):<40} p50 {result['p50_ms']:>9.2f} ms  "
+          f"p95 {result['p95_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+          f"{result['images_per_sec']:>8.1f} img/s  rss {result['peak_rss_mb']:.0f} MB", flush=True)
+    return result
+
+
+def run_concurrent(fn, payloads, concurrency):
+    """Call fn(payload) from `concurrency` threads; return per-call latencies and wall time."""
+    latencies = []
+    lock = threading.Lock()
+    queue = list(payloads)
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                payload = queue.pop()
+            start = time.perf_counter()
+            fn(payload)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+def bench_preprocess(images, requests):
+    results = []
+    for resolution, data in images.items():
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            preprocess_image(io.BytesIO(data))
+            latencies.append(time.perf_counter() - t0)
+        results.append(summarize('preprocess', latencies, requests,
+                                 time.perf_counter() - start, resolution=resolution))
+    return results
+
+
+def bench_model(predictor, batch_sizes, requests):
+    results = []
+    for batch_size in batch_sizes:
+        batch = np.random.default_rng(batch_size).uniform(
+            0, 255, size=(batch_size,) + predictor.input_shape).astype(np.float32)
+        predictor.predict_batch(batch)  # warm-up for this shape
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            predictor.predict_batch(batch)
+            latencies.append(time.perf_counter() - t0)
+        results.append(summarize('model', latencies, batch_size * requests,
+                                 time.perf_counter() - start,
+                                 backend=predictor.backend.name, batch_size=batch_size))
+    return results
+
+
+def build_input_size_model(size, upsample_to=None, num_classes=15):
+    """Untrained MobileNetV2 classifier taking (size, size, 3) 0-255 input, as train.py builds it."""
+    import tensorflow as tf
+    from tensorflow.keras import layers, applications
+
+    inputs = tf.keras.Input(shape=(size, size, 3))
+    x = inputs
+    if upsample_to:
+        x = layers.Resizing(upsample_to, upsample_to)(x)
+    x = layers.Rescaling(1. / 127.5, offset=-1)(x)
+    backbone_size = upsample_to or size
+    x = applications.MobileNetV2(input_shape=(backbone_size, backbone_size, 3),
+                                 include_top=False, weights=None, pooling='avg')(x)
+    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+def bench_input_size(sizes, batch_sizes, requests):
+    """
+    Forward-pass latency per network input resolution (random weights, same
+    serving function as the app), plus the old 128 px input upsampled to 224
+    inside the graph for comparison.
+    """
+    from utils.backends import KerasBackend
+
+    variants = [(f'{s}', s, None) for s in sizes] + [('128->224', 128, 224)]
+    results = []
+    for label, size, upsample_to in variants:
+        backend = KerasBackend(build_input_size_model(size, upsample_to))
+        for batch_size in batch_sizes:
+            batch = np.random.default_rng(batch_size).uniform(
+                0, 255, size=(batch_size, size, size, 3)).astype(np.float32)
+            backend.predict(batch)  # warm-up for this shape
+
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                backend.predict(batch)
+                latencies.append(time.perf_counter() - t0)
+            results.append(summarize('input_size', latencies, batch_size * requests,
+                                     time.perf_counter() - start,
+                                     input_size=label, batch_size=batch_size))
+    return results
+
+
+def bench_predict(predictor, images, concurrency_levels, requests):
+    results = []
+    for resolution, data in images.items():
+        for concurrency in concurrency_levels:
+            payloads = [data] * requests
+            latencies, wall = run_concurrent(
+                lambda d: predictor.predict(io.BytesIO(d)), payloads, concurrency)
+            results.append(summarize('predict', latencies, requests, wall,
+                                     resolution=resolution, concurrency=concurrency))
+    return results
+
+
+def bench_flask(images, concurrency_levels, requests):
+    from app import app
+
+    results = []
+    for resolution, data in images.items():
+        for concurrency in concurrency_levels:
+            def post(d):
+                client = app.test_client()
+                response = client.post('/predict', data={'file': (io.BytesIO(d), 'leaf.jpg')},
+                                       content_type='multipart/form-data')
+                if response.status_code != 200:
+                    raise RuntimeError(f"/predict returned {response.status_code}")
+
+            latencies, wall = run_concurrent(post, [data] * requests, concurrency)
+            results.append(summarize('flask', latencies, requests, wall,
+                                     resolution=resolution, concurrency=concurrency))
+    return results
+
+
+def bench_http(url, images, concurrency_levels, requests):
+    """POST /predict to an already running server, e.g. under gunicorn."""
+    import urllib.request
+    import uuid
+
+    endpoint = url.rstrip('/') + '/predict'
+    results = []
+    for resolution, data in images.items():
+        for concurrency in concurrency_levels:
+            def post(d):
+                boundary = uuid.uuid4().hex
+                body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                        f'filename="leaf.jpg"\r\nContent-Type: image/jpeg\r\n\r\n').encode()
+                body += d + f'\r\n--{boundary}--\r\n'.encode()
+                request = urllib.request.Request(endpoint, data=body, headers={
+                    'Content-Type': f'multipart/form-data; boundary={boundary}'})
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    response.read()
+
+            latencies, wall = run_concurrent(post, [data] * requests, concurrency)
+            results.append(summarize('http', latencies, requests, wall,
+                                     resolution=resolution, concurrency=concurrency))
+    return results
+
+
+def build_similar_index(path, cases, dim=1280, seed=0):
+    """EmbeddingIndex filled with `cases` random unit vectors, written in bulk."""
+    import sqlite3
+    from utils.embeddings import EmbeddingIndex
+
+    index = EmbeddingIndex(path, dim, block_rows=config.EMBEDDING_BLOCK_ROWS)
+    rng = np.random.default_rng(seed)
+    vectors = np.memmap(index.vectors_path, dtype=np.float16, mode='w+', shape=(cases, dim))
+    for start in range(0, cases, 65536):
+        chunk = rng.standard_normal((min(65536, cases - start), dim)).astype(np.float32)
+        vectors[start:start + len(chunk)] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    vectors.flush()
+    del vectors
+
+    conn = sqlite3.connect(index.db_path)
+    conn.execute("CREATE TABLE cases (row INTEGER PRIMARY KEY, created REAL, info TEXT)")
+    with conn:
+        conn.executemany("INSERT INTO cases VALUES (?, 0, '{}')", ((row,) for row in range(cases)))
+    conn.close()
+    return index
+
+
+def bench_similar(index_sizes, requests, k=10):
+    """Top-k search over random float16 indexes of each size (no model needed)."""
+    import tempfile
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for cases in index_sizes:
+            index = build_similar_index(os.path.join(directory, str(cases)), cases)
+            queries = np.random.default_rng(1).standard_normal((requests, index.dim)).astype(np.float32)
+            index.search(queries[0], k=k)  # page the file in
+
+            latencies = []
+            start = time.perf_counter()
+            for query in queries:
+                t0 = time.perf_counter()
+                index.search(query, k=k)
+                latencies.append(time.perf_counter() - t0)
+            results.append(summarize('similar', latencies, requests,
+                                     time.perf_counter() - start, cases=cases))
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the change vs a stored baseline; return True if nothing regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def key(r):
+        return json.dumps({k: v for k, v in r.items() if k in
+                           ('name', 'resolution', 'batch_size', 'concurrency', 'backend', 'input_size',
+                            'cases')},
+                          sort_keys=True)
+
+    previous = {key(r): r for r in baseline['results']}
+    ok = True
+    print(f"\n=== Compared to {baseline_path} (tolerance {tolerance:.0%}) ===")
+    for r in results:
+        old = previous.get(key(r))
+        if old is None:
+            continue
+        p95_change = r['p95_ms'] / old['p95_ms'] - 1
+        ips_change = r['images_per_sec'] / old['images_per_sec'] - 1
+        regressed = p95_change > tolerance or ips_change < -tolerance
+        ok = ok and not regressed
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {key(r)}  "
+              f"p95 {p95_change:+.1%}  img/s {ips_change:+.1%}")
+    return ok
+
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DrCrop inference benchmarks.")
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS),
+                        help="Comma-separated WIDTHxHEIGHT of the synthetic uploads")
+    parser.add_argument('--batch-sizes', default=','.join(map(str, BATCH_SIZES)))
+    parser.add_argument('--concurrency', default=','.join(map(str, CONCURRENCY)))
+    parser.add_argument('--requests', type=int, default=50, help="Requests per scenario")
+    parser.add_argument('--input-sizes', default=','.join(map(str, INPUT_SIZES)),
+                        help="Network input resolutions for the input_size suite")
+    parser.add_argument('--index-sizes', default=','.join(map(str, INDEX_SIZES)),
+                        help="Stored embeddings for the similar suite")
+    parser.add_argument('--suites', default='preprocess,model,predict,flask',
+                        help="Any of preprocess, model, predict, flask, input_size, http, similar")
+    parser.add_argument('--url', default='http://127.0.0.1:8000',
+                        help="Running server for the http suite")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help="Earlier --output file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Allowed p95 / throughput change before flagging a regression")
+    args = parser.parse_args()
+
+    suites = parse_list(args.suites)
+    images = {}
+    for resolution in parse_list(args.resolutions):
+        width, height = map(int, resolution.lower().split('x'))
+        images[resolution] = synthetic_jpeg(width, height)
+
+    results = []
+    if 'preprocess' in suites:
+        results += bench_preprocess(images, args.requests)
+
+    if 'http' in suites:
+        results += bench_http(args.url, images, parse_list(args.concurrency, int), args.requests)
+
+    if 'similar' in suites:
+        results += bench_similar(parse_list(args.index_sizes, int), args.requests)
+
+    if 'input_size' in suites:
+        results += bench_input_size(parse_list(args.input_sizes, int),
+                                    parse_list(args.batch_sizes, int), args.requests)
+
+    if set(suites) & {'model', 'predict', 'flask'}:
+        from utils.predictor import predictor
+        while predictor.state in ('loading', 'warming'):
+            time.sleep(0.1)
+        if not predictor.is_ready:
+            print("Model failed to load; only the preprocess and input_size suites can run.")
+            return 1
+
+        if 'model' in suites:
+            results += bench_model(predictor, parse_list(args.batch_sizes, int), args.requests)
+        if 'predict' in suites:
+            results += bench_predict(predictor, images, parse_list(args.concurrency, int), args.requests)
+        if 'flask' in suites:
+            results += bench_flask(images, parse_list(args.concurrency, int), args.requests)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'python': platform.python_version(), 'machine': platform.machine(),
+                 'cpus': os.cpu_count()},
+        'config': {'backend': config.MODEL_BACKEND, 'image_size': config.IMAGE_SIZE,
+                   'max_batch_size': config.MAX_BATCH_SIZE,
+                   'max_batch_wait_ms': config.MAX_BATCH_WAIT_MS, 'xla': config.XLA_JIT},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        return 0 if compare(results, args.baseline, args.tolerance) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
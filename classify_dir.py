@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+# Offline use: no result reuse, and load the model before starting
+os.environ.setdefault("DRCROP_BACKGROUND_LOAD", "0")
+os.environ.setdefault("DRCROP_CACHE_MAX_ENTRIES", "0")
+os.environ.setdefault("DRCROP_NEAR_DUP_CAPACITY", "0")
+
+from utils.preprocess import preprocess_batch
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+FIELDS = ['path', 'label', 'disease_name', 'crop', 'risk_level', 'confidence', 'error']
+
+
+def find_images(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def decode_chunk(paths, target_size):
+    # Runs in a worker process: decode + resize one chunk into a batch array
+    batch, ok = preprocess_batch(paths, target_size)
+    return paths, batch, ok
+
+
+def already_done(output, fmt):
+    """Paths recorded in an existing output file, so a rerun can resume."""
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output, newline='') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                done.add(row['path'])
+        else:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError):
+                    pass  # torn last line from an interrupted run
+    return done
+
+
+class ResultWriter:
+
+    def __init__(self, output, fmt):
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        self.fmt = fmt
+        self.file = open(output, 'a', newline='')
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.fmt == 'csv':
+                self.csv.writerow(row)
+            else:
+                self.file.write(json.dumps(row) + '\n')
+        # flushed per batch so an interruption loses at most one batch
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def classify(predictor, paths, batch, ok):
+    rows = []
+    good = [i for i in range(len(paths)) if ok[i]]
+    probs = predictor.predict_batch(batch[good]) if good else []
+    by_index = dict(zip(good, probs))
+
+    for i, path in enumerate(paths):
+        if i not in by_index:
+            rows.append({'path': path, 'error': 'Image preprocessing failed'})
+            continue
+        row = by_index[i]
+        top = int(row.argmax())
+        result = predictor.decode_prediction(row)
+        rows.append({
+            'path': path,
+            'label': predictor.class_names[top] if top < len(predictor.class_names) else '',
+            'disease_name': result['disease_name'],
+            'crop': result['crop'],
+            'risk_level': result['risk_level'],
+            'confidence': round(float(row[top]), 6),
+            'error': '',
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify every image under a directory.")
+    parser.add_argument('image_dir')
+    parser.add_argument('--output', default='predictions.jsonl',
+                        help="Results file (.jsonl or .csv); appended to and resumed from")
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help="Defaults to the output file extension")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Decode processes")
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help="Decoded batches kept ahead of the model (default 2x workers)")
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    prefetch = args.prefetch or 2 * args.workers
+
+    done = already_done(args.output, fmt)
+    paths = [p for p in find_images(args.image_dir) if p not in done]
+    print(f"{len(paths)} images to classify ({len(done)} already in {args.output})", flush=True)
+    if not paths:
+        return 0
+
+    # Decode workers are spawned before TensorFlow is loaded in this process
+    pool = multiprocessing.get_context('spawn').Pool(args.workers)
+
+    from utils.predictor import predictor
+    if not predictor.is_ready:
+        print("Model failed to load.")
+        pool.terminate()
+        return 1
+
+    target_size = predictor.input_shape[1::-1]
+    chunks = [paths[i:i + args.batch_size] for i in range(0, len(paths), args.batch_size)]
+    pending = deque()
+    writer = ResultWriter(args.output, fmt)
+
+    start = time.perf_counter()
+    processed = 0
+    try:
+        for chunk in chunks:
+            # keep at most `prefetch` chunks decoding while the model runs
+            while len(pending) >= prefetch:
+                rows = classify(predictor, *pending.popleft().get())
+                writer.write(rows)
+                processed += len(rows)
+            pending.append(pool.apply_async(decode_chunk, (chunk, target_size)))
+
+            if processed:
+                rate = processed / (time.perf_counter() - start)
+                print(f"\r{processed}/{len(paths)} images, {rate:.1f} img/s", end='', flush=True)
+
+        while pending:
+            rows = classify(predictor, *pending.popleft().get())
+            writer.write(rows)
+            processed += len(rows)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume.")
+        pool.terminate()
+        return 130
+    finally:
+        writer.close()
+
+    pool.close()
+    pool.join()
+    elapsed = time.perf_counter() - start
+    print(f"\nClassified {processed} images in {elapsed:.1f} s "
+          f"({processed / elapsed:.1f} img/s) -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
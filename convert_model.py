@@ -1,35 +1,175 @@
 import tensorflow as tf
+import numpy as np
+import argparse
+import random
+import time
 import os
+from utils.backends import TFLiteBackend
+from utils.preprocess import preprocess_image
 
-def convert_to_saved_model():
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def load_keras_model():
     model_path = 'model/model.keras'
     h5_path = 'model/model.h5'
-    
+
     # Try to load the best available local model
+    if os.path.exists(model_path):
+        print(f"Loading from {model_path}...")
+        # We use the custom_objects fix that worked before
+        return tf.keras.models.load_model(
+            model_path,
+            compile=False,
+            custom_objects={'InputLayer': tf.keras.layers.InputLayer}
+        )
+
+    print(f"Loading from {h5_path}...")
+    return tf.keras.models.load_model(
+        h5_path,
+        compile=False,
+        custom_objects={'InputLayer': tf.keras.layers.InputLayer}
+    )
+
+def convert_to_saved_model(model=None):
     try:
-        if os.path.exists(model_path):
-            print(f"Loading from {model_path}...")
-            # We use the custom_objects fix that worked before
-            model = tf.keras.models.load_model(
-                model_path, 
-                compile=False,
-                custom_objects={'InputLayer': tf.keras.layers.InputLayer}
-            )
-        else:
-            print(f"Loading from {h5_path}...")
-            model = tf.keras.models.load_model(
-                h5_path, 
-                compile=False,
-                custom_objects={'InputLayer': tf.keras.layers.InputLayer}
-            )
-        
+        if model is None:
+            model = load_keras_model()
+
         print("Model loaded successfully. Saving as SavedModel format...")
         save_dir = 'model/saved_model_v1'
         model.save(save_dir, save_format='tf')
         print(f"Successfully saved to {save_dir}")
-        
+
+    except Exception as e:
+        print(f"Conversion failed: {e}")
+
+def sample_images(image_dir, count, input_shape, seed=123):
+    """Recursively collect up to `count` images preprocessed to `input_shape` (shuffled, fixed seed)."""
+    paths = []
+    for root, _, names in os.walk(image_dir):
+        paths.extend(os.path.join(root, n) for n in names if n.lower().endswith(IMAGE_EXTENSIONS))
+    paths.sort()
+    random.Random(seed).shuffle(paths)
+
+    images = []
+    for path in paths:
+        if len(images) >= count:
+            break
+        img = preprocess_image(path, input_shape[1::-1])
+        if img is not None:
+            images.append(img[0])
+    return np.stack(images) if images else np.zeros((0,) + input_shape, np.float32)
+
+def convert_to_tflite(model, mode, calibration_images=None):
+    """
+    Convert to TFLite. mode is one of:
+    - 'fp32': plain conversion
+    - 'fp16': float16 weights (half the size, float compute)
+    - 'int8': post-training integer quantization calibrated on calibration_images
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if mode == 'fp16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if calibration_images is None or len(calibration_images) == 0:
+            raise ValueError("int8 quantization needs calibration images (--data-dir)")
+
+        def representative_dataset():
+            for img in calibration_images:
+                yield [img[np.newaxis].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Keep float32 I/O so the serving code does not change
+    elif mode != 'fp32':
+        raise ValueError(f"Unknown TFLite mode: {mode}")
+
+    save_path = f'model/model_{mode}.tflite'
+    with open(save_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"Saved {mode} TFLite model to {save_path} ({os.path.getsize(save_path) / 1e6:.2f} MB)")
+    return save_path
+
+def report_drift(model, tflite_path, images, batch_size=32):
+    """Compare a TFLite model against the float Keras model on the same images."""
+    backend = TFLiteBackend(tflite_path)
+
+    reference, candidate = [], []
+    keras_time = tflite_time = 0.0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+
+        t0 = time.perf_counter()
+        reference.append(model.predict(batch, verbose=0))
+        t1 = time.perf_counter()
+        candidate.append(backend.predict(batch))
+        t2 = time.perf_counter()
+
+        keras_time += t1 - t0
+        tflite_time += t2 - t1
+
+    reference = np.concatenate(reference)
+    candidate = np.concatenate(candidate)
+
+    agreement = float(np.mean(reference.argmax(1) == candidate.argmax(1)))
+    max_abs = float(np.max(np.abs(reference - candidate)))
+    confidence_shift = float(np.mean(np.abs(reference.max(1) - candidate.max(1))))
+
+    print(f"--- Drift report: {tflite_path} on {len(images)} images ---")
+    print(f"Top-1 agreement with float model: {agreement * 100:.2f}%")
+    print(f"Max |prob difference|:            {max_abs:.4f}")
+    print(f"Mean top-1 confidence shift:      {confidence_shift:.4f}")
+    print(f"Keras ms/image:  {keras_time / len(images) * 1000:.2f}")
+    print(f"TFLite ms/image: {tflite_time / len(images) * 1000:.2f}")
+    return agreement
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the trained model for serving.")
+    parser.add_argument('--format', default='saved_model',
+                        choices=['saved_model', 'fp32', 'fp16', 'int8', 'all'],
+                        help="saved_model, a TFLite variant, or all of them")
+    parser.add_argument('--data-dir', default='dataset',
+                        help="Image folder used for int8 calibration and the drift report")
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--eval-samples', type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        model = load_keras_model()
     except Exception as e:
         print(f"Conversion failed: {e}")
+        return
+
+    if args.format in ('saved_model', 'all'):
+        convert_to_saved_model(model)
+
+    modes = ['fp32', 'fp16', 'int8'] if args.format == 'all' else [args.format]
+    modes = [m for m in modes if m != 'saved_model']
+    if not modes:
+        return
+
+    # Calibration and evaluation draw disjoint images from the same shuffle
+    input_shape = tuple(model.input_shape[1:])
+    images = np.zeros((0,) + input_shape, np.float32)
+    if os.path.isdir(args.data_dir):
+        images = sample_images(args.data_dir, args.calibration_samples + args.eval_samples, input_shape)
+    calibration = images[:args.calibration_samples]
+    evaluation = images[args.calibration_samples:]
+
+    for mode in modes:
+        try:
+            path = convert_to_tflite(model, mode, calibration)
+        except Exception as e:
+            print(f"{mode} conversion failed: {e}")
+            continue
+
+        if len(evaluation):
+            report_drift(model, path, evaluation)
+        else:
+            print(f"No evaluation images in '{args.data_dir}'; skipping drift report.")
 
 if __name__ == "__main__":
-    convert_to_saved_model()
+    main()
@@ -14,7 +14,7 @@ try:
         
         # Test a prediction with random data
         import numpy as np
-        dummy_input = np.random.rand(1, 128, 128, 3).astype('float32')
+        dummy_input = np.random.rand(1, *model.input_shape[1:]).astype('float32')
         preds = model.predict(dummy_input, verbose=0)
         print(f"Prediction result shape: {preds.shape}")
         
@@ -22,6 +22,18 @@ try:
              print("SUCCESS: Model output classes match (15).")
         else:
              print(f"FAILURE: Model output classes ({preds.shape[1]}) do not match expected (15).")
+
+        # Per-request framework overhead: model.predict vs the traced serving function
+        from utils.backends import KerasBackend
+        for jit in (False, True):
+            backend = KerasBackend(model, jit_compile=jit)
+            served = backend.predict(dummy_input)
+            if not np.allclose(served, preds, atol=1e-4):
+                print(f"FAILURE: serving function (jit_compile={jit}) output differs from model.predict")
+            timings = backend.measure_overhead(dummy_input)
+            label = "XLA serving_fn" if jit else "serving_fn"
+            print(f"Batch-1 latency: model.predict {timings['model.predict']:.2f} ms, "
+                  f"{label} {timings['serving_fn']:.2f} ms")
              
     else:
         print("FAILURE: model.keras not found!")
@@ -0,0 +1,56 @@
+# gunicorn reads this file automatically from the working directory.
+import os
+import subprocess
+import sys
+
+# Threaded serving: each worker process loads one Predictor and serves
+# `threads` requests concurrently from it, so the micro-batcher can merge
+# their images into one forward pass. DRCROP_WORKER_CLASS=sync gives the
+# previous one-request-per-process behaviour.
+workers = int(os.environ.get("DRCROP_WORKERS", os.environ.get("WEB_CONCURRENCY", 1)))
+worker_class = os.environ.get("DRCROP_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("DRCROP_THREADS", 4))
+timeout = int(os.environ.get("DRCROP_TIMEOUT", 30))
+
+# Pin each worker to its own slice of the CPUs (Linux) and size its
+# TensorFlow pools to that slice, instead of every worker's pools spanning
+# every core.
+cpu_affinity = os.environ.get("DRCROP_CPU_AFFINITY", "0") == "1"
+
+inference_server = None
+
+def on_starting(server):
+    # In client mode the workers are thin; start the one process that
+    # owns the model before any worker boots.
+    global inference_server
+    if os.environ.get("DRCROP_INFERENCE_MODE", "local") == "client":
+        inference_server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve_model.py")]
+        )
+        server.log.info("Started inference server (pid %s)", inference_server.pid)
+
+def pre_fork(server, worker):
+    # Runs in the master: give the new worker the lowest CPU slot no live
+    # worker holds, so a restarted worker takes over its predecessor's cores.
+    used = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+def post_fork(server, worker):
+    if not cpu_affinity or not hasattr(os, "sched_setaffinity"):
+        return
+
+    cpus = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cpus) // max(1, server.num_workers))
+    start = (worker.cpu_slot * per_worker) % len(cpus)
+    assigned = cpus[start:start + per_worker]
+
+    os.sched_setaffinity(0, assigned)
+    # read by utils/config.py when the app is imported after the fork
+    os.environ.setdefault("DRCROP_TF_INTRA_OP_THREADS", str(len(assigned)))
+    os.environ.setdefault("DRCROP_TF_INTER_OP_THREADS", "1")
+    server.log.info("Worker %s pinned to CPUs %s", worker.pid, assigned)
+
+def on_exit(server):
+    if inference_server is not None:
+        inference_server.terminate()
+        inference_server.wait(timeout=10)
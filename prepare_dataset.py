@@ -0,0 +1,139 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from utils import config
+from utils.preprocess import load_rgb
+
+# One-off conversion of dataset/<class>/<image> into pre-resized TFRecord
+# shards, so training never decodes or resizes a JPEG again and does not
+# need the whole dataset in memory (see train.py --shards).
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def list_examples(dataset_dir):
+    class_names = sorted(
+        d for d in os.listdir(dataset_dir)
+        if os.path.isdir(os.path.join(dataset_dir, d))
+    )
+    examples = []
+    for label, name in enumerate(class_names):
+        class_dir = os.path.join(dataset_dir, name)
+        for dirpath, dirnames, filenames in os.walk(class_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    examples.append((os.path.join(dirpath, filename), label))
+    return class_names, examples
+
+
+def decode(example, image_size):
+    # Runs in a worker process: one resized image as raw uint8 RGB bytes
+    path, label = example
+    try:
+        return load_rgb(path, image_size).tobytes(), label
+    except Exception as e:
+        print(f"\nSkipping {path}: {e}", flush=True)
+        return None, label
+
+
+def decode_star(args):
+    return decode(*args)
+
+
+def write_split(pool, tf, examples, output_dir, split, image_size, shard_size):
+
+    written = 0
+    shards = 0
+    writer = None
+    results = pool.imap(decode_star, [(e, image_size) for e in examples], chunksize=64)
+
+    for image, label in results:
+        if image is None:
+            continue
+        if written % shard_size == 0:
+            if writer is not None:
+                writer.close()
+            writer = tf.io.TFRecordWriter(os.path.join(output_dir, f'{split}-{shards:05d}.tfrecord'))
+            shards += 1
+        record = tf.train.Example(features=tf.train.Features(feature={
+            'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image])),
+            'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+        }))
+        writer.write(record.SerializeToString())
+        written += 1
+        if written % 1000 == 0:
+            print(f"\r{split}: {written}/{len(examples)} images", end='', flush=True)
+
+    if writer is not None:
+        writer.close()
+    print(f"\r{split}: {written} images in {shards} shards", flush=True)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write pre-resized TFRecord shards for train.py --shards.")
+    parser.add_argument('--dataset-dir', default='dataset')
+    parser.add_argument('--output-dir', default='dataset_shards')
+    parser.add_argument('--image-size', type=int, default=config.IMAGE_SIZE,
+                        help="Side length images are resized to (default DRCROP_IMAGE_SIZE, must match training)")
+    parser.add_argument('--validation-split', type=float, default=0.2)
+    parser.add_argument('--shard-size', type=int, default=2048, help="Images per shard file")
+    parser.add_argument('--seed', type=int, default=123)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Decode processes")
+    args = parser.parse_args()
+
+    class_names, examples = list_examples(args.dataset_dir)
+    if not examples:
+        print(f"No images found under {args.dataset_dir}")
+        return 1
+    print(f"Found {len(examples)} images in {len(class_names)} classes", flush=True)
+
+    random.Random(args.seed).shuffle(examples)
+    n_val = int(len(examples) * args.validation_split)
+    splits = {'train': examples[n_val:], 'val': examples[:n_val]}
+    image_size = (args.image_size, args.image_size)
+
+    # Drop old shards and the training cache built from them
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache_dir = os.path.join(args.output_dir, 'cache')
+    for directory in (args.output_dir, cache_dir):
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.isfile(path) and (directory == cache_dir or name.endswith('.tfrecord')):
+                    os.remove(path)
+
+    # Decode workers are spawned before TensorFlow is loaded in this process
+    pool = multiprocessing.get_context('spawn').Pool(args.workers)
+    import tensorflow as tf
+
+    start = time.perf_counter()
+    counts = {}
+    try:
+        for split, split_examples in splits.items():
+            counts[split] = write_split(pool, tf, split_examples, args.output_dir,
+                                        split, image_size, args.shard_size)
+    finally:
+        pool.terminate()
+
+    with open(os.path.join(args.output_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'class_names': class_names,
+            'image_size': list(image_size),
+            'counts': counts,
+        }, f, indent=2)
+
+    print(f"Wrote {sum(counts.values())} images to {args.output_dir} "
+          f"in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
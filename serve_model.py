@@ -0,0 +1,32 @@
+import os
+import signal
+import sys
+from utils import config
+
+# This process owns the model, whatever mode the web workers run in
+config.INFERENCE_MODE = "server"
+
+from utils.predictor import predictor
+from utils.inference_server import InferenceServer
+
+def main():
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else config.INFERENCE_SOCKET
+
+    server = InferenceServer(socket_path, predictor)
+    print(f"Inference server listening on {socket_path} (pid {os.getpid()})", flush=True)
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+if __name__ == '__main__':
+    main()
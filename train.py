@@ -1,8 +1,14 @@
 import os
+import argparse
+import hashlib
+import json
+import time
 import tensorflow as tf
 from tensorflow.keras import layers, models, applications
 import numpy as np
 import ssl
+from utils import config
+from utils.manifest import write_manifest
 
 # Fix SSL context for downloading weights (on some environments)
 try:
@@ -15,62 +21,198 @@ else:
 # Configuration
 DATASET_DIR = 'dataset'
 MODEL_DIR = 'model'
-IMG_SIZE = (128, 128)  # Matches app.py input
-TARGET_IMG_SIZE = (224, 224) # MobileNetV2 expects 224x224
+# Native network input size, shared with serving (DRCROP_IMAGE_SIZE); the
+# app reads it back from the saved model's input shape
+IMG_SIZE = (config.IMAGE_SIZE, config.IMAGE_SIZE)
 BATCH_SIZE = 32
 EPOCHS = 25
+FEATURE_DIR = os.path.join(MODEL_DIR, 'features')
+SHARD_DIR = 'dataset_shards'
 
-def train_model():
-    if not os.path.exists(DATASET_DIR):
-        print(f"Error: Dataset directory '{DATASET_DIR}' not found.")
-        print("Please create a 'dataset' folder with subfolders for each class.")
-        return
+def load_sharded_dataset(shard_dir, split, training):
+    """
+    Batched (image, label) dataset read from the TFRecord shards written by
+    prepare_dataset.py. Shards are read in parallel (interleave) and the
+    parsed uint8 images are cached to a file under <shard_dir>/cache, so
+    nothing has to fit in memory and later epochs skip the parse step.
+    """
+    AUTOTUNE = tf.data.AUTOTUNE
+    features = {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    }
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, features)
+        image = tf.reshape(tf.io.decode_raw(example['image'], tf.uint8), IMG_SIZE + (3,))
+        return image, tf.cast(example['label'], tf.int32)
+
+    files = tf.data.Dataset.list_files(os.path.join(shard_dir, f'{split}-*.tfrecord'),
+                                       shuffle=training, seed=123)
+    ds = files.interleave(tf.data.TFRecordDataset,
+                          cycle_length=min(8, os.cpu_count() or 1),
+                          num_parallel_calls=AUTOTUNE,
+                          deterministic=not training)
+    ds = ds.map(parse, num_parallel_calls=AUTOTUNE)
+
+    cache_dir = os.path.join(shard_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    ds = ds.cache(os.path.join(cache_dir, split))
+
+    if training:
+        ds = ds.shuffle(10000)
+    ds = ds.batch(BATCH_SIZE)
+    # uint8 in the cache, float32 (0-255) like image_dataset_from_directory
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.float32), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(buffer_size=AUTOTUNE)
+
+def dataset_fingerprint(shard_dir=None):
+    """
+    Identify the training data: the shard meta.json and shard files, or every
+    file under DATASET_DIR, by relative path, size and mtime.
+    """
+    root = shard_dir or DATASET_DIR
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        # the shard reader's parse cache is derived data
+        dirnames[:] = sorted(d for d in dirnames if not (shard_dir and d == 'cache'))
+        for name in sorted(filenames):
+            stat = os.stat(os.path.join(dirpath, name))
+            relative = os.path.relpath(os.path.join(dirpath, name), root)
+            digest.update(f"{relative}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+
+    return {
+        'source': f"shards:{shard_dir}" if shard_dir else f"directory:{DATASET_DIR}",
+        'files_sha256': digest.hexdigest(),
+    }
 
+def cache_bottleneck_features(ds, extractor, count, path, augmentation=None, views=1, fingerprint=None):
+    """
+    Run the frozen backbone once over `ds` and store the pooled features in a
+    float16 memory-mapped .npy (plus labels), `views` passes per image; every
+    pass after the first goes through `augmentation`. A sidecar _meta.json
+    records what the features were computed from (`fingerprint`, image size,
+    views); existing files are reused only when it matches.
+    """
+    labels_path = path.replace('.npy', '_labels.npy')
+    meta_path = path.replace('.npy', '_meta.json')
+    width = extractor.output_shape[-1]
+    shape = (count * views, width)
+    meta = dict(fingerprint or {}, image_size=list(IMG_SIZE), views=views, shape=list(shape))
+
+    if os.path.exists(path) and os.path.exists(labels_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            cached_meta = json.load(f)
+        features = np.load(path, mmap_mode='r')
+        if features.shape == shape and cached_meta == meta:
+            print(f"Reusing cached features {path} {shape}")
+            return features, np.load(labels_path)
+        print(f"Cached features {path} are stale, extracting again")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # an interrupted extraction must not look reusable
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    features = np.lib.format.open_memmap(path, mode='w+', dtype=np.float16, shape=shape)
+    labels = np.zeros(shape[0], dtype=np.int32)
+
+    row = 0
+    for view in range(views):
+        print(f"Extracting features to {path} (view {view + 1}/{views})...")
+        for images, batch_labels in ds:
+            if view > 0 and augmentation is not None:
+                images = augmentation(images, training=True)
+            batch_features = extractor(images, training=False).numpy()
+            n = len(batch_features)
+            features[row:row + n] = batch_features
+            labels[row:row + n] = batch_labels.numpy()
+            row += n
+
+    features.flush()
+    np.save(labels_path, labels[:row])
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return features[:row], labels[:row]
+
+def load_datasets(shard_dir=None):
+    """(train_ds, val_ds, class_names, train_count, val_count), or None on error."""
     print("Loading dataset...")
-    # Load dataset
-    try:
-        train_ds = tf.keras.utils.image_dataset_from_directory(
-            DATASET_DIR,
-            validation_split=0.2,
-            subset="training",
-            seed=123,
-            image_size=IMG_SIZE,
-            batch_size=BATCH_SIZE
-        )
-        
-        val_ds = tf.keras.utils.image_dataset_from_directory(
-            DATASET_DIR,
-            validation_split=0.2,
-            subset="validation",
-            seed=123,
-            image_size=IMG_SIZE,
-            batch_size=BATCH_SIZE
-        )
-    except Exception as e:
-         print(f"Failed to load dataset: {e}")
-         return
+    if shard_dir:
+        # Pre-resized shards from prepare_dataset.py
+        with open(os.path.join(shard_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if tuple(meta['image_size']) != IMG_SIZE:
+            print(f"Error: shards in '{shard_dir}' are {meta['image_size']}, training expects {IMG_SIZE}.")
+            return None
+        class_names = meta['class_names']
+        train_count = meta['counts']['train']
+        val_count = meta['counts']['val']
+        train_ds = load_sharded_dataset(shard_dir, 'train', training=True)
+        val_ds = load_sharded_dataset(shard_dir, 'val', training=False)
+    else:
+        if not os.path.exists(DATASET_DIR):
+            print(f"Error: Dataset directory '{DATASET_DIR}' not found.")
+            print("Please create a 'dataset' folder with subfolders for each class.")
+            return None
 
-    class_names = train_ds.class_names
-    num_classes = len(class_names)
-    print(f"Found {num_classes} classes: {class_names}")
+        # Load dataset
+        try:
+            train_ds = tf.keras.utils.image_dataset_from_directory(
+                DATASET_DIR,
+                validation_split=0.2,
+                subset="training",
+                seed=123,
+                image_size=IMG_SIZE,
+                batch_size=BATCH_SIZE
+            )
+            
+            val_ds = tf.keras.utils.image_dataset_from_directory(
+                DATASET_DIR,
+                validation_split=0.2,
+                subset="validation",
+                seed=123,
+                image_size=IMG_SIZE,
+                batch_size=BATCH_SIZE
+            )
+        except Exception as e:
+             print(f"Failed to load dataset: {e}")
+             return None
 
-    # Prefetch for performance
-    AUTOTUNE = tf.data.AUTOTUNE
-    train_ds = train_ds.cache().shuffle(1000).prefetch(buffer_size=AUTOTUNE)
-    val_ds = val_ds.cache().prefetch(buffer_size=AUTOTUNE)
+        class_names = train_ds.class_names
+        train_count = len(train_ds.file_paths)
+        val_count = len(val_ds.file_paths)
 
-    # Data Augmentation
-    data_augmentation = tf.keras.Sequential([
+        # Prefetch for performance
+        AUTOTUNE = tf.data.AUTOTUNE
+        train_ds = train_ds.cache().shuffle(1000).prefetch(buffer_size=AUTOTUNE)
+        val_ds = val_ds.cache().prefetch(buffer_size=AUTOTUNE)
+
+    print(f"Found {len(class_names)} classes: {class_names}")
+    return train_ds, val_ds, class_names, train_count, val_count
+
+def make_augmentation():
+    return tf.keras.Sequential([
         layers.RandomFlip("horizontal_and_vertical"),
         layers.RandomRotation(0.2),
         layers.RandomZoom(0.2),
     ])
 
+def train_model(cache_features=False, augmented_views=0, shard_dir=None):
+    datasets = load_datasets(shard_dir)
+    if datasets is None:
+        return
+    train_ds, val_ds, class_names, train_count, val_count = datasets
+    num_classes = len(class_names)
+
+    # Data Augmentation
+    data_augmentation = make_augmentation()
+
     # Base Model (MobileNetV2)
     # Using include_top=False to remove the classification head
     # Using weights='imagenet' for transfer learning
-    # Input shape is (224, 224, 3) for MobileNetV2
-    base_model = applications.MobileNetV2(input_shape=TARGET_IMG_SIZE + (3,),
+    # Built at the native input size: no upsampling in the graph. ImageNet
+    # weights exist for 96/128/160/192/224 px.
+    base_model = applications.MobileNetV2(input_shape=IMG_SIZE + (3,),
                                           include_top=False,
                                           weights='imagenet')
     
@@ -83,9 +225,7 @@ def train_model():
     # Preprocessing pipeline
     # 1. Augment data
     x = data_augmentation(inputs)
-    # 2. Resize to 224x224 for MobileNetV2
-    x = layers.Resizing(TARGET_IMG_SIZE[0], TARGET_IMG_SIZE[1])(x)
-    # 3. Rescale for MobileNetV2 (-1 to 1)
+    # 2. Rescale for MobileNetV2 (-1 to 1)
     # Note: image_dataset loads 0-255. MobileNetV2 expects -1 to 1.
     x = layers.Rescaling(1./127.5, offset=-1)(x) # 0-255 -> -1 to 1
     
@@ -93,9 +233,10 @@ def train_model():
     x = base_model(x, training=False)
     
     # Classification head
-    x = layers.GlobalAveragePooling2D()(x)
-    x = layers.Dropout(0.2)(x)  # Regularization
-    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    pooled = layers.GlobalAveragePooling2D()(x)
+    head_dropout = layers.Dropout(0.2)  # Regularization
+    head_dense = layers.Dense(num_classes, activation='softmax')
+    outputs = head_dense(head_dropout(pooled))
     
     model = tf.keras.Model(inputs, outputs)
 
@@ -109,11 +250,42 @@ def train_model():
 
     # Train
     print("Starting training...")
-    history = model.fit(
-        train_ds,
-        validation_data=val_ds,
-        epochs=EPOCHS
-    )
+    if cache_features:
+        # The backbone is frozen in this phase, so its pooled output is a
+        # fixed function of the image: compute it once, then train only the
+        # head on the cached 1280-d vectors (seconds per epoch instead of a
+        # full MobileNetV2 pass per image per epoch).
+        # The head layers are shared with `model`, so it ends up trained too.
+        extractor = tf.keras.Model(inputs, pooled)
+        fingerprint = dataset_fingerprint(shard_dir)
+        train_features, train_labels = cache_bottleneck_features(
+            train_ds, extractor, train_count,
+            os.path.join(FEATURE_DIR, 'train_features.npy'),
+            augmentation=data_augmentation, views=1 + augmented_views,
+            fingerprint=fingerprint)
+        val_features, val_labels = cache_bottleneck_features(
+            val_ds, extractor, val_count,
+            os.path.join(FEATURE_DIR, 'val_features.npy'),
+            fingerprint=fingerprint)
+
+        head_inputs = tf.keras.Input(shape=(train_features.shape[1],))
+        head = tf.keras.Model(head_inputs, head_dense(head_dropout(head_inputs)))
+        head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=base_learning_rate),
+                     loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=False),
+                     metrics=['accuracy'])
+        history = head.fit(
+            train_features, train_labels,
+            validation_data=(val_features, val_labels),
+            batch_size=BATCH_SIZE,
+            epochs=EPOCHS,
+            shuffle=True
+        )
+    else:
+        history = model.fit(
+            train_ds,
+            validation_data=val_ds,
+            epochs=EPOCHS
+        )
     
     # Use callbacks for saving best model during training if desired, but user just asked to save at end or 'model/model.h5'.
     # We will stick to the basic requirement first.
@@ -157,7 +329,6 @@ def train_model():
     print(f"Model saved to {model_save_path}")
 
     # Save class names list (Requirements: model/class_names.json)
-    import json
     class_names_path = os.path.join(MODEL_DIR, 'class_names.json')
     with open(class_names_path, 'w') as f:
         json.dump(class_names, f)
@@ -170,6 +341,210 @@ def train_model():
         json.dump(class_indices, f)
     print(f"Class indices saved to {class_indices_path}")
 
+    # Versioned manifest; running servers poll it and swap this model in
+    manifest = write_manifest(os.path.join(MODEL_DIR, 'manifest.json'),
+                              model_save_path, class_names, IMG_SIZE)
+    print(f"Manifest written (version {manifest['version']})")
+
+# Smaller student backbones for distillation (ImageNet weights, pooled output)
+STUDENTS = {
+    'mobilenet_v2_0.35': lambda shape: applications.MobileNetV2(
+        input_shape=shape, alpha=0.35, include_top=False, weights='imagenet', pooling='avg'),
+    'mobilenet_v2_0.5': lambda shape: applications.MobileNetV2(
+        input_shape=shape, alpha=0.5, include_top=False, weights='imagenet', pooling='avg'),
+    'mobilenet_v2_0.75': lambda shape: applications.MobileNetV2(
+        input_shape=shape, alpha=0.75, include_top=False, weights='imagenet', pooling='avg'),
+    'mobilenet_v3_small': lambda shape: applications.MobileNetV3Small(
+        input_shape=shape, include_top=False, weights='imagenet', pooling='avg',
+        include_preprocessing=False),
+}
+STUDENT_DIR = os.path.join(MODEL_DIR, 'students')
+# Candidate cascade thresholds evaluated in the distillation report
+CASCADE_THRESHOLDS = (0.5, 0.75, 0.8, 0.85, 0.9, 0.95, 0.99)
+
+def build_student(name, num_classes):
+    """Student taking the same 0-255 IMG_SIZE input as the teacher; outputs logits."""
+    inputs = tf.keras.Input(shape=IMG_SIZE + (3,))
+    x = layers.Rescaling(1./127.5, offset=-1)(inputs)
+    x = STUDENTS[name](IMG_SIZE + (3,))(x)
+    x = layers.Dropout(0.2)(x)
+    logits = layers.Dense(num_classes)(x)
+    return tf.keras.Model(inputs, logits, name=name)
+
+class Distiller(tf.keras.Model):
+    """
+    Trains `student` (logits) on a mix of the true labels and the teacher's
+    temperature-softened predictions. Both see the same augmented batch.
+    """
+
+    def __init__(self, student, teacher, augmentation, temperature=4.0, alpha=0.1):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.augmentation = augmentation
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = tf.keras.metrics.Mean(name='loss')
+        self.accuracy = tf.keras.metrics.SparseCategoricalAccuracy(name='accuracy')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy]
+
+    def call(self, images, training=False):
+        return self.student(images, training=training)
+
+    def train_step(self, data):
+        images, labels = data
+        images = self.augmentation(images, training=True)
+        # The teacher ends in softmax; its log-probabilities act as logits
+        teacher_logits = tf.math.log(tf.clip_by_value(self.teacher(images, training=False), 1e-7, 1.0))
+        soft_targets = tf.nn.softmax(teacher_logits / self.temperature)
+
+        with tf.GradientTape() as tape:
+            logits = self.student(images, training=True)
+            hard_loss = tf.keras.losses.sparse_categorical_crossentropy(labels, logits, from_logits=True)
+            soft_loss = tf.keras.losses.categorical_crossentropy(
+                soft_targets, logits / self.temperature, from_logits=True)
+            loss = tf.reduce_mean(self.alpha * hard_loss
+                                  + (1 - self.alpha) * soft_loss * self.temperature ** 2)
+
+        variables = self.student.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(labels, logits)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        images, labels = data
+        logits = self.student(images, training=False)
+        self.loss_tracker.update_state(tf.reduce_mean(
+            tf.keras.losses.sparse_categorical_crossentropy(labels, logits, from_logits=True)))
+        self.accuracy.update_state(labels, logits)
+        return {m.name: m.result() for m in self.metrics}
+
+def evaluate_accuracy(model, ds, thresholds=CASCADE_THRESHOLDS):
+    """
+    (accuracy, by_threshold) on `ds`. For each candidate cascade threshold,
+    `coverage` is the share of images whose top-1 probability reaches it
+    (the ones a cascade stage would answer) and `accuracy` the accuracy on
+    those images alone (None when none qualify).
+    """
+    confidences, hits = [], []
+    for images, labels in ds:
+        probs = model(images, training=False).numpy()
+        confidences.append(probs.max(axis=-1))
+        hits.append(probs.argmax(axis=-1) == labels.numpy())
+    confidences = np.concatenate(confidences) if confidences else np.zeros(0)
+    hits = np.concatenate(hits) if hits else np.zeros(0, dtype=bool)
+    total = max(len(hits), 1)
+
+    by_threshold = []
+    for threshold in thresholds:
+        answered = confidences >= threshold
+        count = int(answered.sum())
+        by_threshold.append({
+            'threshold': threshold,
+            'coverage': count / total,
+            'accuracy': float(hits[answered].mean()) if count else None,
+        })
+    return float(hits.sum()) / total, by_threshold
+
+def measure_latency(model, batch_size=1, repeats=50):
+    """p50 ms per call through the same serving function the web app uses."""
+    from utils.backends import KerasBackend
+
+    backend = KerasBackend(model)
+    batch = np.random.default_rng(0).uniform(
+        0, 255, size=(batch_size,) + tuple(model.input_shape[1:])).astype(np.float32)
+    for _ in range(3):
+        backend.predict(batch)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.predict(batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.percentile(timings, 50) * 1000)
+
+def distill_students(names, shard_dir=None, epochs=15, temperature=4.0):
+    """
+    Distill each student in `names` from model/model.h5, save it as
+    model/students/<name>.keras and print an accuracy-vs-latency table
+    (validation accuracy, CPU p50 latency at batch 1 and 16), followed by the
+    coverage and accuracy of each model at the candidate cascade thresholds;
+    all of it is also written to model/students/report.json.
+    """
+    teacher_path = os.path.join(MODEL_DIR, 'model.h5')
+    if not os.path.exists(teacher_path):
+        print(f"Error: teacher model '{teacher_path}' not found; train it first.")
+        return
+
+    datasets = load_datasets(shard_dir)
+    if datasets is None:
+        return
+    train_ds, val_ds, class_names, _, _ = datasets
+
+    teacher = tf.keras.models.load_model(teacher_path, compile=False)
+    teacher.trainable = False
+
+    val_accuracy, by_threshold = evaluate_accuracy(teacher, val_ds)
+    rows = [{
+        'model': 'teacher (mobilenet_v2_1.0)',
+        'path': teacher_path,
+        'params': teacher.count_params(),
+        'val_accuracy': val_accuracy,
+        'thresholds': by_threshold,
+        'p50_ms_batch1': measure_latency(teacher, 1),
+        'p50_ms_batch16': measure_latency(teacher, 16),
+    }]
+
+    os.makedirs(STUDENT_DIR, exist_ok=True)
+    for name in names:
+        print(f"\nDistilling {name}...")
+        student = build_student(name, len(class_names))
+        distiller = Distiller(student, teacher, make_augmentation(), temperature=temperature)
+        distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-4))
+        distiller.fit(train_ds, validation_data=val_ds, epochs=epochs)
+
+        # Serve probabilities like the teacher
+        model = tf.keras.Model(student.input, layers.Softmax()(student.output))
+        path = os.path.join(STUDENT_DIR, f'{name}.keras')
+        model.save(path)
+
+        val_accuracy, by_threshold = evaluate_accuracy(model, val_ds)
+        rows.append({
+            'model': name,
+            'path': path,
+            'params': model.count_params(),
+            'val_accuracy': val_accuracy,
+            'thresholds': by_threshold,
+            'p50_ms_batch1': measure_latency(model, 1),
+            'p50_ms_batch16': measure_latency(model, 16),
+        })
+
+    print(f"\nAccuracy vs CPU latency ({os.cpu_count()} CPUs, p50 over 50 calls)")
+    print(f"| {'model':<28} | {'params':>10} | {'val acc':>7} | {'batch 1 ms':>10} | {'batch 16 ms':>11} |")
+    print(f"| {'-' * 28} | {'-' * 10} | {'-' * 7} | {'-' * 10} | {'-' * 11} |")
+    for row in rows:
+        print(f"| {row['model']:<28} | {row['params']:>10,} | {row['val_accuracy']:>7.2%} | "
+              f"{row['p50_ms_batch1']:>10.2f} | {row['p50_ms_batch16']:>11.2f} |")
+
+    # what a cascade stage at each threshold would answer, and how well
+    print("\nCascade thresholds: coverage / accuracy on the images at or above the threshold")
+    print(f"| {'model':<28} | " + " | ".join(f"{t:>15}" for t in CASCADE_THRESHOLDS) + " |")
+    print(f"| {'-' * 28} | " + " | ".join('-' * 15 for _ in CASCADE_THRESHOLDS) + " |")
+    for row in rows:
+        cells = [f"{t['coverage']:>6.1%} / " + (f"{t['accuracy']:.1%}" if t['accuracy'] is not None else "-")
+                 for t in row['thresholds']]
+        print(f"| {row['model']:<28} | " + " | ".join(f"{c:>15}" for c in cells) + " |")
+
+    report_path = os.path.join(STUDENT_DIR, 'report.json')
+    with open(report_path, 'w') as f:
+        json.dump({'cpus': os.cpu_count(), 'temperature': temperature,
+                   'epochs': epochs, 'results': rows}, f, indent=2)
+    print(f"Report saved to {report_path}")
+
 def create_dummy_model():
     """Creates a dummy model structure for testing the app without a full dataset training run."""
     print("Creating dummy MobileNetV2 model for testing...")
@@ -177,14 +552,13 @@ def create_dummy_model():
     # It creates the architecture but weights are random/imagenet default without training
     num_classes = 38 
     
-    base_model = applications.MobileNetV2(input_shape=TARGET_IMG_SIZE + (3,),
+    base_model = applications.MobileNetV2(input_shape=IMG_SIZE + (3,),
                                           include_top=False,
                                           weights='imagenet')
     base_model.trainable = False
     
     inputs = tf.keras.Input(shape=IMG_SIZE + (3,))
-    x = layers.Resizing(TARGET_IMG_SIZE[0], TARGET_IMG_SIZE[1])(inputs)
-    x = layers.Rescaling(1./127.5, offset=-1)(x)
+    x = layers.Rescaling(1./127.5, offset=-1)(inputs)
     x = base_model(x, training=False)
     x = layers.GlobalAveragePooling2D()(x)
     outputs = layers.Dense(num_classes, activation='softmax')(x)
@@ -199,9 +573,33 @@ def create_dummy_model():
     print("Dummy model saved to model/model.h5")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the crop disease model.")
+    parser.add_argument('--cache-features', action='store_true',
+                        help="Train the head on cached backbone features (memory-mapped in model/features)")
+    parser.add_argument('--augmented-views', type=int, default=0,
+                        help="Extra augmented feature passes per training image with --cache-features")
+    parser.add_argument('--shards', nargs='?', const=SHARD_DIR, default=None, metavar='DIR',
+                        help=f"Read TFRecord shards from prepare_dataset.py (default {SHARD_DIR})")
+    parser.add_argument('--distill', nargs='?', const=','.join(STUDENTS), metavar='STUDENTS',
+                        help="Distill smaller students from model/model.h5 instead of training "
+                             f"(comma-separated, default all of: {', '.join(STUDENTS)})")
+    parser.add_argument('--distill-epochs', type=int, default=15)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    args = parser.parse_args()
+
+    if args.distill:
+        names = [n.strip() for n in args.distill.split(',') if n.strip()]
+        unknown = [n for n in names if n not in STUDENTS]
+        if unknown:
+            parser.error(f"unknown students: {', '.join(unknown)}")
+        distill_students(names, shard_dir=args.shards, epochs=args.distill_epochs,
+                         temperature=args.temperature)
+    elif args.shards:
+        train_model(cache_features=args.cache_features, augmented_views=args.augmented_views,
+                    shard_dir=args.shards)
     # Check if dataset exists
-    if os.path.exists(DATASET_DIR) and len(os.listdir(DATASET_DIR)) > 0:
-        train_model()
+    elif os.path.exists(DATASET_DIR) and len(os.listdir(DATASET_DIR)) > 0:
+        train_model(cache_features=args.cache_features, augmented_views=args.augmented_views)
     else:
         print("Dataset not found or empty.")
         choice = input("Do you want to create a dummy model architecture for testing? (y/n): ")
@@ -0,0 +1,124 @@
+import math
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# Admission control in front of the model. Each process keeps a count of
+# images admitted but not yet answered and a moving average of the forward
+# pass cost per image; together they estimate how long a new request would
+# wait. Requests are refused up front (503 + Retry-After) when that wait
+# exceeds the request deadline or the queue is full, instead of queueing
+# until gunicorn's worker timeout kills them.
+
+
+class Overloaded(Exception):
+    """Request shed; `reason` is queue_full, deadline or client_gone."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+
+    def __init__(self, max_queue=64, deadline_seconds=10.0, smoothing=0.2):
+
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self.smoothing = smoothing
+
+        self.depth = 0
+        self.seconds_per_image = 0.0
+        self.shed = {"queue_full": 0, "deadline": 0, "client_gone": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_queue > 0
+
+    def record_batch(self, seconds, size):
+        """Feed the per-image cost estimate from one forward pass."""
+
+        if size <= 0:
+            return
+        per_image = seconds / size
+        with self._lock:
+            if self.seconds_per_image == 0.0:
+                self.seconds_per_image = per_image
+            else:
+                self.seconds_per_image += self.smoothing * (per_image - self.seconds_per_image)
+
+    def estimated_wait(self, extra=0):
+        return (self.depth + extra) * self.seconds_per_image
+
+    def retry_after(self):
+        # seconds until the current backlog should have drained
+        return min(60, max(1, math.ceil(self.estimated_wait())))
+
+    def count_shed(self, reason):
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def acquire(self, images=1):
+        """
+        Take `images` queue slots and return the request's deadline
+        (time.monotonic()), or raise Overloaded at once. A request is always
+        admitted into an empty queue, so a batch larger than max_queue still
+        runs when the process is idle. Every acquire needs a release.
+        """
+
+        deadline = time.monotonic() + self.deadline_seconds
+
+        with self._lock:
+            reason = None
+            if not self.enabled:
+                pass
+            elif self.depth > 0 and self.depth + images > self.max_queue:
+                reason = "queue_full"
+            elif self.depth > 0 and self.estimated_wait(images) > self.deadline_seconds:
+                reason = "deadline"
+
+            if reason is not None:
+                self.shed[reason] += 1
+                raise Overloaded(reason, self.retry_after())
+
+            self.depth += images
+
+        return deadline
+
+    def release(self, images=1):
+        with self._lock:
+            self.depth -= images
+
+    @contextmanager
+    def admit(self, images=1):
+        """acquire() / release() around a block, which receives the deadline."""
+
+        deadline = self.acquire(images)
+        try:
+            yield deadline
+        finally:
+            self.release(images)
+
+
+def client_connected(sock):
+    """
+    Callable reporting whether the peer of `sock` is still connected,
+    checked without blocking or consuming data. Returns None when the
+    server does not expose the socket (e.g. the Flask development server).
+    """
+
+    if sock is None or not hasattr(socket, "MSG_DONTWAIT"):
+        return None
+
+    def connected():
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b""
+        except BlockingIOError:
+            return True  # open, nothing sent
+        except OSError:
+            return False
+
+    return connected
@@ -0,0 +1,263 @@
+import threading
+import time
+
+import numpy as np
+
+from utils import config
+
+# Inference backends selectable through DRCROP_MODEL_BACKEND. Each one wraps
+# a loaded model artifact behind predict(batch) -> softmax rows, where batch
+# is the float32 (N, H, W, 3) array built from preprocess_image, and exposes
+# the (H, W, 3) input_shape the artifact was built for (None if unknown).
+#
+# TensorFlow is imported inside the loaders so that a TFLite-only deployment
+# can run on the much smaller tflite_runtime package.
+
+
+_tf_configured = False
+
+
+def import_tensorflow():
+    """
+    Import TensorFlow and size its thread pools from DRCROP_TF_*_THREADS.
+    Pools can only be sized before TensorFlow runs its first op, so every
+    TensorFlow import on the serving path goes through here.
+    """
+
+    global _tf_configured
+    import tensorflow as tf
+
+    if not _tf_configured:
+        _tf_configured = True
+        try:
+            if config.TF_INTRA_OP_THREADS > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(config.TF_INTRA_OP_THREADS)
+            if config.TF_INTER_OP_THREADS > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(config.TF_INTER_OP_THREADS)
+        except RuntimeError as e:
+            print(f"TensorFlow thread pools not resized: {e}", flush=True)
+
+    return tf
+
+
+def _static_shape(dims):
+    """(H, W, C) as ints, or None if any dimension is unknown."""
+
+    dims = tuple(dims)
+    if not dims or any(d is None or int(d) <= 0 for d in dims):
+        return None
+    return tuple(int(d) for d in dims)
+
+
+class KerasBackend:
+    """
+    Keras model served through a traced tf.function with a fixed
+    (None, H, W, 3) float32 signature, instead of model.predict which builds
+    a data adapter and callback machinery on every call.
+
+    With jit_compile=True the function is XLA-compiled. XLA specializes on
+    the concrete batch size, so batches are zero-padded up to the nearest of
+    `batch_buckets` and only those shapes are ever compiled (see warmup).
+    """
+
+    name = "keras"
+
+    def __init__(self, model, compiled=True, jit_compile=False, batch_buckets=()):
+
+        self.model = model
+        self.input_shape = _static_shape(model.input_shape[1:])
+        self.compiled = compiled
+        self.jit_compile = jit_compile
+        self.serving_fn = None
+        self.features = None
+        self.embedding_fn = None
+        self.embedding_dim = None
+        # model.predict is not safe to call from several threads at once;
+        # the traced function is
+        self._predict_lock = threading.Lock()
+        self.batch_buckets = sorted(batch_buckets) if jit_compile else []
+
+        if compiled:
+            tf = import_tensorflow()
+
+            spec = tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32)
+            self.serving_fn = tf.function(
+                lambda images: model(images, training=False),
+                input_signature=[spec],
+                jit_compile=jit_compile
+            )
+
+    def predict(self, batch):
+
+        if self.serving_fn is None:
+            with self._predict_lock:
+                return self.model.predict(batch, verbose=0)
+
+        size = batch.shape[0]
+        return self.serving_fn(self._pad(batch)).numpy()[:size]
+
+    def _pad(self, batch):
+
+        size = batch.shape[0]
+        bucket = next((b for b in self.batch_buckets if b >= size), size)
+
+        if bucket > size:
+            padding = np.zeros((bucket - size,) + batch.shape[1:], dtype=batch.dtype)
+            batch = np.concatenate([batch, padding])
+
+        return batch
+
+    def enable_embeddings(self):
+        """
+        Also serve the output of the model's last GlobalAveragePooling2D
+        layer (the 1280-d MobileNetV2 feature vector train.py feeds to the
+        classifier head) through predict_with_embeddings. Returns its size,
+        or None when the model has no such layer.
+        """
+
+        tf = import_tensorflow()
+
+        pooling = [layer for layer in self.model.layers
+                   if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)]
+        if not pooling:
+            return None
+
+        self.features = tf.keras.Model(self.model.inputs, [self.model.outputs[0], pooling[-1].output])
+        self.embedding_dim = int(pooling[-1].output.shape[-1])
+
+        if self.compiled:
+            spec = tf.TensorSpec((None,) + tuple(self.model.input_shape[1:]), tf.float32)
+            self.embedding_fn = tf.function(
+                lambda images: self.features(images, training=False),
+                input_signature=[spec],
+                jit_compile=self.jit_compile
+            )
+
+        return self.embedding_dim
+
+    def predict_with_embeddings(self, batch):
+        """(softmax rows, embedding rows) for `batch` in one forward pass."""
+
+        if self.embedding_fn is None:
+            with self._predict_lock:
+                probs, embeddings = self.features.predict(batch, verbose=0)
+            return probs, embeddings
+
+        size = batch.shape[0]
+        probs, embeddings = self.embedding_fn(self._pad(batch))
+        return probs.numpy()[:size], embeddings.numpy()[:size]
+
+    def measure_overhead(self, batch, repeats=20):
+        """Mean ms per call of model.predict vs the serving function on `batch`."""
+
+        timings = {}
+        runners = {"model.predict": lambda: self.model.predict(batch, verbose=0)}
+        if self.serving_fn is not None:
+            runners["serving_fn"] = lambda: self.serving_fn(batch).numpy()
+
+        for label, run in runners.items():
+            run()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                run()
+            timings[label] = (time.perf_counter() - start) / repeats * 1000
+
+        return timings
+
+
+class SavedModelBackend:
+
+    name = "saved_model"
+
+    def __init__(self, path):
+
+        tf = import_tensorflow()
+
+        self._tf = tf
+        self.loaded = tf.saved_model.load(path)
+        self.fn = self.loaded.signatures["serving_default"]
+        self.input_name, spec = next(iter(self.fn.structured_input_signature[1].items()))
+        self.input_shape = _static_shape(spec.shape[1:])
+
+    def predict(self, batch):
+
+        outputs = self.fn(**{self.input_name: self._tf.constant(batch)})
+        return next(iter(outputs.values())).numpy()
+
+
+def _tflite_interpreter(path, num_threads=None):
+
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        Interpreter = import_tensorflow().lite.Interpreter
+
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter (float32, float16 or int8 weights). Quantized inputs
+    and outputs are (de)quantized here, and the input tensor is resized when
+    the batch size changes. The interpreter is not thread-safe, so calls are
+    serialized.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path, num_threads=None):
+
+        self.interpreter = _tflite_interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input["shape"][0])
+        self.input_shape = _static_shape(self.input["shape"][1:])
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+
+        with self._lock:
+
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self.input = self.interpreter.get_input_details()[0]
+                self.output = self.interpreter.get_output_details()[0]
+                self._batch_size = batch.shape[0]
+
+            self.interpreter.set_tensor(self.input["index"], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self.output["index"]))
+
+    def _quantize(self, batch):
+
+        dtype = self.input["dtype"]
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+
+        scale, zero_point = self.input["quantization"]
+        info = np.iinfo(dtype)
+        values = np.round(batch / scale + zero_point)
+        return np.clip(values, info.min, info.max).astype(dtype)
+
+    def _dequantize(self, values):
+
+        if self.output["dtype"] == np.float32:
+            return values
+
+        scale, zero_point = self.output["quantization"]
+        return (values.astype(np.float32) - zero_point) * scale
+
+
+def load_backend(name, path, num_threads=None):
+    """Load a non-Keras backend by name ("saved_model" or "tflite")."""
+
+    if name == "saved_model":
+        return SavedModelBackend(path)
+
+    if name == "tflite":
+        return TFLiteBackend(path, num_threads=num_threads)
+
+    raise ValueError(f"Unknown model backend: {name}")
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-image requests into one batched forward pass.
+
+    Callers hand in one preprocessed image (H, W, C) and block on the result.
+    A background thread waits until either `max_batch_size` images are queued
+    or the oldest one has waited `max_wait_ms`, stacks them, calls
+    `run_batch(batch)` once and hands each caller its own row of the output
+    (or a tuple of rows when run_batch returns a tuple of arrays).
+
+    Requests may carry a `deadline` (time.monotonic()) and an `alive`
+    callable. Ones that expired, were cancelled or whose client went away
+    while queued are failed (TimeoutError / ConnectionAbortedError) instead
+    of taking a place in the batch.
+
+    close() lets the worker answer what is queued and exit; images submitted
+    after that run on the caller's thread, so a request that picked up a
+    just-replaced model still gets its answer.
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=5.0):
+
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+        self._closed = False
+
+    def submit(self, image, deadline=None, alive=None):
+        """Queue one image and return a Future resolving to its prediction row."""
+
+        future = Future()
+
+        with self._cond:
+            if not self._closed:
+                self._ensure_worker()
+                self._queue.append((image, future, deadline, alive))
+                self._cond.notify()
+                return future
+
+        future.set_running_or_notify_cancel()
+        try:
+            self._check(deadline, alive)
+            future.set_result(self._rows(self.run_batch(np.expand_dims(image, axis=0)))[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        """End the worker thread once the queue has drained."""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def predict(self, image, timeout=None, deadline=None, alive=None):
+
+        if self.max_batch_size == 1:
+            self._check(deadline, alive)
+            return self._rows(self.run_batch(np.expand_dims(image, axis=0)))[0]
+
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        future = self.submit(image, deadline, alive)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # still queued: the worker will skip it
+            if future.cancel():
+                raise TimeoutError("Deadline passed while queued") from None
+            return future.result()
+
+    @staticmethod
+    def _rows(outputs):
+
+        # per-image rows; a tuple of arrays becomes one tuple per image
+        if isinstance(outputs, tuple):
+            return list(zip(*outputs))
+        return outputs
+
+    @staticmethod
+    def _check(deadline, alive):
+
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError("Deadline passed while queued")
+        if alive is not None and not alive():
+            raise ConnectionAbortedError("Client disconnected")
+
+    def _ensure_worker(self):
+
+        # gunicorn forks after import, and threads do not survive a fork,
+        # so the worker is started lazily in whichever process submits.
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+
+        self._worker_pid = os.getpid()
+        self._worker = threading.Thread(
+            target=self._loop,
+            name="drcrop-batcher",
+            daemon=True
+        )
+        self._worker.start()
+
+    def _next_batch(self):
+
+        with self._cond:
+
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            deadline = time.monotonic() + self.max_wait
+
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _admit(self, items):
+
+        # drop what nobody is waiting for any more before spending model time
+        admitted = []
+        for image, future, deadline, alive in items:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._check(deadline, alive)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            admitted.append((image, future))
+        return admitted
+
+    def _loop(self):
+
+        while True:
+
+            items = self._next_batch()
+            if items is None:
+                # closed and drained: drop the references to run_batch's model
+                self._worker = None
+                return
+
+            batch = self._admit(items)
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+
+            try:
+                images = np.stack([image for image, _ in batch])
+                outputs = self._rows(self.run_batch(images))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SqliteCacheStore:
+    """
+    On-disk second level for PredictionCache, shared by every gunicorn worker
+    on the host. Entries expire after the TTL; beyond `max_entries` the oldest
+    inserts are dropped (FIFO, so lookups never need a write).
+    """
+
+    def __init__(self, path, max_entries=100000):
+
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._puts = 0
+
+    def _connection(self):
+
+        # sqlite connections must not be shared across fork()
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, expires REAL, value TEXT)"
+            )
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get(self, key):
+
+        # a locked, corrupt or unreadable store is a cache miss, not a failed
+        # prediction
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT value FROM predictions WHERE key = ? AND expires > ?",
+                    (key, time.time())
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Prediction cache store error: {e}", flush=True)
+            return None
+
+    def put(self, key, value, expires):
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                    (key, expires, json.dumps(value))
+                )
+                self._puts += 1
+                if self._puts % 256 == 0:
+                    self._trim(conn)
+
+    def _trim(self, conn):
+
+        conn.execute("DELETE FROM predictions WHERE expires <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM predictions WHERE rowid IN ("
+            "SELECT rowid FROM predictions ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of formatted prediction results.
+
+    Keys are a SHA-256 of the model version plus the raw upload bytes, so a
+    retried or re-uploaded photo skips inference, and a model change never
+    serves stale answers. The in-process level is an LRU bounded to
+    `max_entries` with a per-entry TTL; an optional SqliteCacheStore shares
+    results between worker processes.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, store=None):
+
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.store = store
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(data, model_version):
+
+        digest = hashlib.sha256(model_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self.store.get(key) if self.store is not None else None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, value, now + self.ttl)
+        return value
+
+    def put(self, key, value):
+
+        expires = time.time() + self.ttl
+
+        with self._lock:
+            self._insert(key, value, expires)
+
+        if self.store is not None:
+            try:
+                self.store.put(key, value, expires)
+            except sqlite3.Error as e:
+                print(f"Prediction cache store error: {e}", flush=True)
+
+    def _insert(self, key, value, expires):
+
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
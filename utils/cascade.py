@@ -0,0 +1,145 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+# Confidence-gated model cascade. Cheap models (e.g. the students written by
+# `train.py --distill`) see every image first; an image whose top-1
+# probability clears the stage threshold is answered there, the rest move on
+# to the next stage and finally to the full model. Declared in the manifest:
+#
+#   "cascade": [
+#     {"path": "students/mobilenet_v2_0.35.keras", "backend": "keras",
+#      "threshold": 0.9, "sha256": "..."}
+#   ]
+#
+# All stages share the manifest's class list and input size.
+
+CASCADE_IMAGES = REGISTRY.counter(
+    "drcrop_cascade_images_total",
+    "Images answered by each cascade stage"
+)
+CASCADE_ESCALATIONS = REGISTRY.counter(
+    "drcrop_cascade_escalations_total",
+    "Images passed on to the next stage, by the stage that was unsure"
+)
+# a gauge: it falls while most images escalate and the cheap stages cost extra
+CASCADE_SAVED_SECONDS = REGISTRY.gauge(
+    "drcrop_cascade_compute_saved_seconds",
+    "Estimated inference time saved against running the full model on every image"
+)
+
+# derived from the counters above so dashboards need no PromQL
+REGISTRY.callback(
+    "drcrop_cascade_escalation_ratio",
+    "Share of cascade images that reached the full model",
+    "gauge",
+    lambda: [({}, round(escalation_ratio(), 6))] if images_seen() else []
+)
+REGISTRY.callback(
+    "drcrop_cascade_compute_saved_seconds_per_image",
+    "Average estimated inference time saved per classified image",
+    "gauge",
+    lambda: [({}, round(CASCADE_SAVED_SECONDS.value() / images_seen(), 6))] if images_seen() else []
+)
+
+
+def images_seen():
+    return sum(value for _, _, value in CASCADE_IMAGES.samples())
+
+
+def escalation_ratio():
+    # share answered by the final stage ("full"), whatever the number of stages
+    seen = images_seen()
+    final = CASCADE_IMAGES.value(stage="full")
+    return final / seen if seen else 0.0
+
+
+class CascadeStage:
+    """One model of the cascade; `threshold` is None for the full model."""
+
+    def __init__(self, name, predict, threshold=None, smoothing=0.2):
+
+        self.name = name
+        self.predict = predict  # (N, H, W, 3) 0-255 float32 -> softmax rows
+        self.threshold = threshold
+        self.smoothing = smoothing
+
+        self.seconds_per_image = 0.0
+        self._lock = threading.Lock()
+
+    def run(self, images):
+
+        start = time.perf_counter()
+        probs = self.predict(images)
+        elapsed = time.perf_counter() - start
+
+        per_image = elapsed / len(images)
+        with self._lock:
+            if self.seconds_per_image == 0.0:
+                self.seconds_per_image = per_image
+            else:
+                self.seconds_per_image += self.smoothing * (per_image - self.seconds_per_image)
+
+        return probs, elapsed
+
+
+class ModelCascade:
+
+    def __init__(self, stages):
+
+        if not stages or stages[-1].threshold is not None:
+            raise ValueError("a cascade ends with the full model (threshold None)")
+
+        self.stages = stages
+
+    @property
+    def full(self):
+        return self.stages[-1]
+
+    def warmup(self, images):
+
+        # every stage sees the batch, so each one is traced and has a cost
+        # estimate before it is needed (zeros would stop at the first stage)
+        for stage in self.stages:
+            stage.run(images)
+
+    def predict(self, images):
+
+        count = len(images)
+        pending = np.arange(count)
+        output = None
+        spent = 0.0
+
+        for stage in self.stages:
+
+            batch = images if len(pending) == count else images[pending]
+            probs, elapsed = stage.run(batch)
+            spent += elapsed
+
+            if output is None:
+                output = np.empty((count, probs.shape[-1]), dtype=np.float32)
+
+            if stage.threshold is None:
+                output[pending] = probs
+                CASCADE_IMAGES.inc(len(pending), stage=stage.name)
+                break
+
+            confident = np.max(probs, axis=-1) >= stage.threshold
+            answered = int(np.count_nonzero(confident))
+
+            output[pending[confident]] = probs[confident]
+            pending = pending[~confident]
+
+            if answered:
+                CASCADE_IMAGES.inc(answered, stage=stage.name)
+            if len(pending):
+                CASCADE_ESCALATIONS.inc(len(pending), stage=stage.name)
+            else:
+                break
+
+        CASCADE_SAVED_SECONDS.inc(count * self.full.seconds_per_image - spent)
+
+        return output
@@ -0,0 +1,162 @@
+import os
+
+# Runtime configuration, overridable through environment variables so the
+# same image can be tuned per deployment (Render / Procfile) without edits.
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Micro-batching of concurrent /predict calls (utils/batcher.py).
+# MAX_BATCH_SIZE = 1 disables batching and calls the model directly.
+MAX_BATCH_SIZE = _env_int("DRCROP_MAX_BATCH_SIZE", 16)
+MAX_BATCH_WAIT_MS = _env_float("DRCROP_MAX_BATCH_WAIT_MS", 5.0)
+
+# Admission control (utils/admission.py): at most ADMISSION_MAX_QUEUE images
+# waiting for the model per process (0 disables), and a request that would
+# not be answered within REQUEST_DEADLINE_SECONDS is refused with 503 at once.
+ADMISSION_MAX_QUEUE = _env_int("DRCROP_ADMISSION_MAX_QUEUE", 64)
+REQUEST_DEADLINE_SECONDS = _env_float("DRCROP_REQUEST_DEADLINE_SECONDS", 10)
+
+# Quality gate (utils/quality.py) run on the preprocessed image before the
+# model: "flag" (the default) predicts as usual and attaches feedback for
+# blurred, badly exposed or leaf-less uploads, "reject" answers them with
+# the feedback instead of a forward pass, "off" disables it. The thresholds apply at the model input size; print
+# their distribution on real photos with `python -m utils.quality DIR`.
+QUALITY_GATE = os.environ.get("DRCROP_QUALITY_GATE", "flag")
+QUALITY_MIN_BRIGHTNESS = _env_float("DRCROP_QUALITY_MIN_BRIGHTNESS", 30)
+QUALITY_MAX_BRIGHTNESS = _env_float("DRCROP_QUALITY_MAX_BRIGHTNESS", 225)
+QUALITY_MIN_SHARPNESS = _env_float("DRCROP_QUALITY_MIN_SHARPNESS", 10)
+QUALITY_MIN_GREEN_FRACTION = _env_float("DRCROP_QUALITY_MIN_GREEN_FRACTION", 0.05)
+
+# Multi-image /predict/batch endpoint.
+BATCH_MAX_FILES = _env_int("DRCROP_BATCH_MAX_FILES", 100)
+PREPROCESS_WORKERS = _env_int(
+    "DRCROP_PREPROCESS_WORKERS", min(4, os.cpu_count() or 1)
+)
+
+# Keeping a copy of uploads is optional; when enabled they are written in the
+# background under unique names and pruned to the newest UPLOAD_MAX_FILES.
+SAVE_UPLOADS = os.environ.get("DRCROP_SAVE_UPLOADS", "0") == "1"
+UPLOAD_MAX_FILES = _env_int("DRCROP_UPLOAD_MAX_FILES", 1000)
+
+# Prediction cache keyed on upload bytes + model version (utils/cache.py).
+# CACHE_MAX_ENTRIES = 0 disables it; CACHE_PATH adds a SQLite level shared
+# by all workers on the host.
+CACHE_MAX_ENTRIES = _env_int("DRCROP_CACHE_MAX_ENTRIES", 1024)
+CACHE_TTL_SECONDS = _env_float("DRCROP_CACHE_TTL_SECONDS", 3600)
+CACHE_PATH = os.environ.get("DRCROP_CACHE_PATH", "")
+CACHE_PATH_MAX_ENTRIES = _env_int("DRCROP_CACHE_PATH_MAX_ENTRIES", 100000)
+
+# Perceptual-hash reuse of recent predictions for near-duplicate images
+# (utils/phash.py). Off by default (NEAR_DUP_CAPACITY = 0): a reused
+# prediction is never recomputed, so enable it only where re-uploads of the
+# same leaf are common and a wrong reuse is acceptable.
+NEAR_DUP_CAPACITY = _env_int("DRCROP_NEAR_DUP_CAPACITY", 0)
+NEAR_DUP_MAX_DISTANCE = _env_int("DRCROP_NEAR_DUP_MAX_DISTANCE", 4)
+NEAR_DUP_MAX_CHROMA = _env_float("DRCROP_NEAR_DUP_MAX_CHROMA", 0.03)
+
+# Model input resolution (square side in pixels), the one setting shared by
+# training (train.py builds the network at this native size), dataset
+# preparation and preprocessing. Serving reads the size from the loaded model
+# and only falls back to IMAGE_SIZE when the artifact does not declare one.
+IMAGE_SIZE = _env_int("DRCROP_IMAGE_SIZE", 128)
+
+# Inference backend: "keras" (model/model.keras, .h5 fallback),
+# "saved_model" or "tflite" (artifacts written by convert_model.py).
+# MODEL_ARTIFACT overrides the default artifact path for the backend.
+MODEL_BACKEND = os.environ.get("DRCROP_MODEL_BACKEND", "keras")
+MODEL_ARTIFACT = os.environ.get("DRCROP_MODEL_ARTIFACT", "")
+
+# Versioned model manifest (utils/manifest.py). When the file exists it
+# decides the backend, artifact, class list, input size and normalization,
+# overriding the settings above. Loaded models poll it every
+# MANIFEST_POLL_SECONDS (0 disables) and swap a changed model in without a
+# restart.
+MODEL_MANIFEST = os.environ.get(
+    "DRCROP_MODEL_MANIFEST",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model", "manifest.json")
+)
+MANIFEST_POLL_SECONDS = _env_float("DRCROP_MANIFEST_POLL_SECONDS", 10)
+
+# Confidence-gated cascade (utils/cascade.py): when the manifest lists
+# cheaper models, they answer the images they are confident about and only
+# the rest reach the full model. CASCADE=0 serves the full model alone.
+CASCADE_ENABLED = os.environ.get("DRCROP_CASCADE", "1") == "1"
+
+# Embedding store (utils/embeddings.py): with EMBEDDINGS=1 every model
+# prediction also appends the image's pooled feature vector to a float16
+# index under EMBEDDING_DIR, searchable through /predict/similar. Needs the
+# keras backend; the vector comes from the full model, so the cascade is
+# skipped while the store is on.
+EMBEDDINGS = os.environ.get("DRCROP_EMBEDDINGS", "0") == "1"
+EMBEDDING_DIR = os.environ.get(
+    "DRCROP_EMBEDDING_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embeddings")
+)
+EMBEDDING_BLOCK_ROWS = _env_int("DRCROP_EMBEDDING_BLOCK_ROWS", 8192)
+SIMILAR_MAX_K = _env_int("DRCROP_SIMILAR_MAX_K", 50)
+
+# Keras backend: serve through a traced tf.function (SERVING_FUNCTION=0 falls
+# back to model.predict), optionally XLA-compiled. The model is warmed up at
+# load for WARMUP_BATCH_SIZES, which are also the XLA padding buckets.
+SERVING_FUNCTION = os.environ.get("DRCROP_SERVING_FUNCTION", "1") == "1"
+XLA_JIT = os.environ.get("DRCROP_XLA_JIT", "0") == "1"
+WARMUP_BATCH_SIZES = sorted({
+    int(size)
+    for size in os.environ.get(
+        "DRCROP_WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE}"
+    ).split(",")
+    if size.strip()
+})
+
+# TensorFlow / TFLite thread pools per process (0 = library default, which
+# sizes the pools to every core on the host). With several workers per host
+# give each about cores / workers intra-op threads; gunicorn.conf.py does
+# this per worker when DRCROP_CPU_AFFINITY=1.
+TF_INTRA_OP_THREADS = _env_int("DRCROP_TF_INTRA_OP_THREADS", 0)
+TF_INTER_OP_THREADS = _env_int("DRCROP_TF_INTER_OP_THREADS", 0)
+
+# Shared inference process (serve_model.py). In "client" mode gunicorn
+# workers do not load TensorFlow; they send preprocessed tensors to the
+# server over INFERENCE_SOCKET, through shared memory unless disabled.
+INFERENCE_MODE = os.environ.get("DRCROP_INFERENCE_MODE", "local")
+INFERENCE_SOCKET = os.environ.get("DRCROP_INFERENCE_SOCKET", "/tmp/drcrop-inference.sock")
+INFERENCE_SHARED_MEMORY = os.environ.get("DRCROP_INFERENCE_SHARED_MEMORY", "1") == "1"
+INFERENCE_CONNECT_TIMEOUT = _env_float("DRCROP_INFERENCE_CONNECT_TIMEOUT", 120)
+
+# Load TensorFlow and the model in a background thread so the port binds
+# immediately; /readyz reports when the model is loaded and warmed up.
+BACKGROUND_LOAD = os.environ.get("DRCROP_BACKGROUND_LOAD", "1") == "1"
+
+# Asynchronous prediction jobs (/jobs), persisted in a local SQLite file so
+# the backlog survives restarts. JOB_WORKERS threads run in every process.
+JOBS_DB_PATH = os.environ.get(
+    "DRCROP_JOBS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs.sqlite3")
+)
+JOB_WORKERS = _env_int("DRCROP_JOB_WORKERS", 2)
+JOB_MAX_WAIT_SECONDS = _env_float("DRCROP_JOB_MAX_WAIT_SECONDS", 30)
+JOB_RETENTION_SECONDS = _env_float("DRCROP_JOB_RETENTION_SECONDS", 86400)
+
+# Tiled inference for large images (/predict/tiled, utils/tiling.py). The
+# whole source is decoded (3 bytes per pixel), so TILED_MAX_PIXELS bounds a
+# tiled request's memory; PIL refuses images above twice its own
+# MAX_IMAGE_PIXELS (about 179 MP) regardless.
+TILE_STRIDE = _env_int("DRCROP_TILE_STRIDE", 96)
+TILE_BATCH_SIZE = _env_int("DRCROP_TILE_BATCH_SIZE", 64)
+TILED_MAX_PIXELS = _env_int("DRCROP_TILED_MAX_PIXELS", 64_000_000)
+# A disease outranks healthy tiles only when it covers at least this many
+# tiles and this share of all tiles (one noisy tile is not a diagnosis).
+TILED_MIN_DISEASE_TILES = _env_int("DRCROP_TILED_MIN_DISEASE_TILES", 2)
+TILED_MIN_DISEASE_FRACTION = _env_float("DRCROP_TILED_MIN_DISEASE_FRACTION", 0.01)
+
+# Every other route decodes uploads whole except JPEGs, which are decoded at
+# a reduced scale (see preprocess.load_rgb); images still larger than this
+# after that reduction are refused before decoding.
+UPLOAD_MAX_PIXELS = _env_int("DRCROP_UPLOAD_MAX_PIXELS", 40_000_000)
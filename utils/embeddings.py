@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Similar-case search over the image embeddings of past predictions.
+#
+# Each model version gets its own index (embeddings of different models are
+# not comparable), stored as two files next to each other:
+#
+#   <version>.f16      rows of L2-normalized float16 vectors, memory-mapped
+#                      for search and grown in large steps
+#   <version>.sqlite3  one row per case: row number, time, prediction
+#
+# The SQLite write lock serializes appends from every gunicorn worker on the
+# host: a vector is written to its row before the case row commits, and
+# readers only map rows that have committed.
+
+
+class EmbeddingIndex:
+
+    def __init__(self, path, dim, grow_rows=65536, block_rows=8192):
+
+        self.vectors_path = f"{path}.f16"
+        self.db_path = f"{path}.sqlite3"
+        self.dim = dim
+        self.grow_rows = grow_rows
+        self.block_rows = block_rows
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._map = None
+
+    def _connection(self):
+
+        # sqlite connections must not be shared across fork()
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cases ("
+                "row INTEGER PRIMARY KEY, created REAL, info TEXT)"
+            )
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def __len__(self):
+
+        with self._lock:
+            return self._count(self._connection())
+
+    @staticmethod
+    def _count(conn):
+        return conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM cases").fetchone()[0]
+
+    def add(self, vector, info):
+        """Append one embedding with its JSON-serializable `info`; returns the case id."""
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        data = vector.astype(np.float16).tobytes()
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._count(conn)
+                self._write(row, data)
+                conn.execute("INSERT INTO cases VALUES (?, ?, ?)", (row, time.time(), json.dumps(info)))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return row
+
+    def _write(self, row, data):
+
+        row_bytes = self.dim * 2
+        fd = os.open(self.vectors_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size < (row + 1) * row_bytes:
+                # grow in big steps so the file stays mostly contiguous
+                os.ftruncate(fd, (row + self.grow_rows) * row_bytes)
+            os.pwrite(fd, data, row * row_bytes)
+        finally:
+            os.close(fd)
+
+    def _vectors(self, count):
+
+        # remap only when rows were added beyond the current mapping
+        mapped = self._map
+        if mapped is None or len(mapped) < count:
+            mapped = self._map = np.memmap(self.vectors_path, dtype=np.float16, mode="r",
+                                           shape=(count, self.dim))
+        return mapped[:count]
+
+    def search(self, queries, k=10, exclude=()):
+        """
+        Top-`k` cosine neighbours of each row of `queries` (Q, dim). Returns
+        (rows, scores), both (Q, k') with k' = min(k, cases), best first.
+
+        The float16 matrix is streamed in blocks of `block_rows`: each block
+        is widened into one reused float32 buffer, multiplied with all
+        queries at once and cut down to its own top k with argpartition, so
+        a search reads every stored vector once with bounded scratch memory.
+        """
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            count = self._count(self._connection())
+            vectors = self._vectors(count) if count else None
+
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        buffer = np.empty((min(self.block_rows, count), self.dim), dtype=np.float32)
+
+        for start in range(0, count, self.block_rows):
+
+            block = buffer[:min(self.block_rows, count - start)]
+            block[...] = vectors[start:start + len(block)]
+            scores = queries @ block.T
+
+            for row in exclude:
+                if start <= row < start + len(block):
+                    scores[:, row - start] = -np.inf
+
+            rows = np.arange(start, start + len(block))
+            if len(block) > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = rows[keep]
+            else:
+                rows = np.broadcast_to(rows, scores.shape)
+
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        # excluded rows can only be left over when fewer than k remain
+        valid = np.isfinite(best_scores).all(axis=0)
+        return best_rows[:, valid], best_scores[:, valid]
+
+    def cases(self, rows):
+        """{row: {"case_id", "created", **info}} for the given rows."""
+
+        rows = [int(row) for row in rows]
+        if not rows:
+            return {}
+
+        with self._lock:
+            found = self._connection().execute(
+                f"SELECT row, created, info FROM cases WHERE row IN ({','.join('?' * len(rows))})",
+                rows
+            ).fetchall()
+
+        return {row: {"case_id": row, "created": created, **json.loads(info)} for row, created, info in found}
+
+
+class EmbeddingStore:
+    """One EmbeddingIndex per model version under `directory`, opened on first use."""
+
+    def __init__(self, directory, block_rows=8192):
+
+        self.directory = directory
+        self.block_rows = block_rows
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, version, dim):
+
+        with self._lock:
+            index = self._indexes.get(version)
+            if index is None:
+                os.makedirs(self.directory, exist_ok=True)
+                index = self._indexes[version] = EmbeddingIndex(
+                    os.path.join(self.directory, version), dim, block_rows=self.block_rows
+                )
+            return index
@@ -0,0 +1,276 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# One process owns the model and answers predictions over a Unix domain
+# socket; gunicorn workers become thin clients (see RemotePredictor).
+#
+# Wire format: every message is a frame of
+#   !II (header length, payload length) + JSON header + raw payload.
+# Image batches travel through a shared-memory block owned by the client
+# (header carries its name and the array shape), or inline in the payload
+# when shared memory is disabled. Replies carry the float32 softmax rows.
+
+_FRAME = struct.Struct("!II")
+
+
+def _recv_exact(sock, size):
+
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("inference socket closed")
+        received += n
+
+    return bytes(buf)
+
+
+def send_frame(sock, header, payload=b""):
+
+    head = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(head), len(payload)) + head + payload)
+
+
+def recv_frame(sock):
+
+    head_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, head_len))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+
+        predictor = self.server.predictor
+        attached = {}
+
+        try:
+            while True:
+
+                try:
+                    header, payload = recv_frame(self.request)
+                except ConnectionError:
+                    return
+
+                op = header.get("op")
+
+                if op == "info":
+                    loaded = predictor.active
+                    send_frame(self.request, {
+                        "ready": predictor.is_ready,
+                        "class_names": loaded.class_names,
+                        "model_version": loaded.version,
+                        "input_shape": list(loaded.input_shape),
+                        "backend": loaded.backend.name if loaded.backend else None,
+                    })
+                    continue
+
+                if op != "predict":
+                    send_frame(self.request, {"error": f"unknown op {op!r}"})
+                    continue
+
+                try:
+                    batch = self._read_batch(header, payload, attached)
+                    probs = self._predict(predictor, batch)
+                except Exception as e:
+                    send_frame(self.request, {"error": str(e)})
+                    continue
+
+                probs = np.ascontiguousarray(probs, dtype=np.float32)
+                send_frame(self.request, {"shape": list(probs.shape)}, probs.tobytes())
+
+        finally:
+            for shm in attached.values():
+                shm.close()
+
+    @staticmethod
+    def _read_batch(header, payload, attached):
+
+        shape = tuple(header["shape"])
+
+        if "shm" not in header:
+            return np.frombuffer(payload, dtype=np.float32).reshape(shape)
+
+        name = header["shm"]
+        shm = attached.get(name)
+        if shm is None:
+            # each client thread keeps one block per connection and only
+            # replaces it (unlinked on its side) when it needs a bigger one:
+            # drop the old mapping so its memory is actually freed
+            for old in attached.values():
+                old.close()
+            attached.clear()
+            shm = shared_memory.SharedMemory(name=name)
+            # the client owns (and unlinks) the block; stop this process's
+            # resource tracker from unlinking it on exit
+            resource_tracker.unregister(shm._name, "shared_memory")
+            attached[name] = shm
+
+        # copy out: the client may reuse the block as soon as we reply
+        return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+
+    @staticmethod
+    def _predict(predictor, batch):
+
+        if not predictor.is_ready:
+            raise RuntimeError("Model not loaded")
+
+        # clients learn about a model swap on their next update check; until
+        # then their tensors may be sized for the previous model
+        loaded = predictor.active
+        if batch.shape[1:] != loaded.input_shape:
+            raise RuntimeError(f"Input shape {batch.shape[1:]} does not match model {loaded.version}")
+
+        # single images from all workers are merged by the server's batcher
+        if batch.shape[0] == 1:
+            predictions = loaded.batcher.predict(batch[0])
+            if loaded.embedding_dim is not None:
+                predictions = predictions[0]  # clients only take probabilities
+            return predictions[np.newaxis]
+
+        return predictor.predict_batch(batch, loaded)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, predictor):
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        self.predictor = predictor
+        super().__init__(socket_path, _Handler)
+
+
+class RemoteBackend:
+    """
+    Backend that forwards batches to an InferenceServer. Each client thread
+    gets its own connection and shared-memory block, grown on demand.
+    """
+
+    name = "remote"
+
+    def __init__(self, socket_path, use_shared_memory=True, timeout=30.0):
+
+        self.socket_path = socket_path
+        self.use_shared_memory = use_shared_memory
+        self.timeout = timeout
+        self._local = threading.local()
+        self._blocks = []
+        self._blocks_lock = threading.Lock()
+
+    def _connection(self):
+
+        local = self._local
+
+        # blocks and sockets inherited through fork() belong to the parent
+        if getattr(local, "pid", None) != os.getpid():
+            local.pid = os.getpid()
+            local.sock = None
+            local.shm = None
+
+        if local.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            local.sock = sock
+
+        return local
+
+    def _request(self, header, payload=b""):
+
+        local = self._connection()
+        try:
+            send_frame(local.sock, header, payload)
+            reply, data = recv_frame(local.sock)
+        except OSError:
+            # drop the broken connection so the next call reconnects
+            local.sock.close()
+            local.sock = None
+            raise
+
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply, data
+
+    def info(self):
+
+        reply, _ = self._request({"op": "info"})
+        return reply
+
+    def wait_until_ready(self, timeout):
+        """Poll the server until its model is loaded; return its info or None."""
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                info = self.info()
+                if info["ready"]:
+                    return info
+            except OSError:
+                pass
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.5)
+
+    def _shared_block(self, nbytes):
+
+        local = self._connection()
+        if local.shm is None or local.shm.size < nbytes:
+            if local.shm is not None:
+                self._release(local.shm)
+            local.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            with self._blocks_lock:
+                self._blocks.append((os.getpid(), local.shm))
+        return local.shm
+
+    def _release(self, shm):
+
+        with self._blocks_lock:
+            self._blocks = [(pid, b) for pid, b in self._blocks if b is not shm]
+        shm.close()
+        shm.unlink()
+
+    def predict(self, batch):
+
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        header = {"op": "predict", "shape": list(batch.shape)}
+        payload = b""
+
+        if self.use_shared_memory:
+            shm = self._shared_block(batch.nbytes)
+            np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[...] = batch
+            header["shm"] = shm.name
+        else:
+            payload = batch.tobytes()
+
+        reply, data = self._request(header, payload)
+        return np.frombuffer(data, dtype=np.float32).reshape(reply["shape"])
+
+    def close(self):
+
+        with self._blocks_lock:
+            blocks, self._blocks = self._blocks, []
+        for pid, shm in blocks:
+            shm.close()
+            if pid == os.getpid():
+                shm.unlink()
@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Asynchronous prediction jobs backed by a local SQLite file.
+#
+# Submitting stores the uploads and returns a job id at once; worker threads
+# (in every gunicorn worker sharing the file) claim queued jobs with an
+# atomic UPDATE, run them through Predictor.predict_stream and store the
+# formatted results. Jobs survive restarts: a job left "running" by a dead
+# process is re-queued once its lease expires.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT,
+    data BLOB,
+    result TEXT,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+class JobQueue:
+
+    def __init__(self, path, predictor, workers=2, lease_seconds=300, retention_seconds=86400):
+
+        self.path = path
+        self.predictor = predictor
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+
+        self._local = threading.local()
+        self._done = threading.Condition()
+        self._started_pid = None
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """Start the worker threads in this process (idempotent per process)."""
+
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+
+        for n in range(self.workers):
+            threading.Thread(target=self._worker, name=f"drcrop-jobs-{n}", daemon=True).start()
+
+    def submit(self, files):
+        """Queue a job for [(filename, bytes), ...]; return its id."""
+
+        job_id = uuid.uuid4().hex
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created) VALUES (?, 'queued', ?)",
+                (job_id, time.time())
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, position, filename, data) VALUES (?, ?, ?, ?)",
+                [(job_id, i, name, data) for i, (name, data) in enumerate(files)]
+            )
+        with self._done:
+            self._done.notify_all()
+        return job_id
+
+    def get(self, job_id, wait=0.0):
+        """
+        Job status and results, or None if unknown. With `wait` > 0 this
+        long-polls until the job finishes or the timeout passes.
+        """
+
+        deadline = time.monotonic() + wait
+
+        while True:
+            job = self._read(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                return job
+            # woken early by local workers; other processes are seen by polling
+            with self._done:
+                self._done.wait(min(remaining, 0.25))
+
+    def queue_depth(self):
+
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()
+        return row[0]
+
+    def _read(self, job_id):
+
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT status, created, started, finished, error FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status, created, started, finished, error = row
+        job = {"job_id": job_id, "status": status, "created": created}
+        if started:
+            job["started"] = started
+        if finished:
+            job["finished"] = finished
+        if error:
+            job["error"] = error
+
+        if status == "done":
+            items = conn.execute(
+                "SELECT position, filename, result FROM job_items WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+            job["results"] = [
+                {"index": position, "filename": filename, **json.loads(result)}
+                for position, filename, result in items
+            ]
+        return job
+
+    def _claim(self):
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # re-queue jobs whose worker died mid-run
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL "
+                "WHERE status = 'running' AND started < ?",
+                (now - self.lease_seconds,)
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                (now, row[0])
+            ).rowcount
+        return row[0] if claimed else None
+
+    def _run(self, job_id):
+
+        conn = self._connection()
+        items = conn.execute(
+            "SELECT position, data FROM job_items WHERE job_id = ? ORDER BY position",
+            (job_id,)
+        ).fetchall()
+
+        results = {}
+        for offset, result in self.predictor.predict_stream([bytes(data) for _, data in items]):
+            results[items[offset][0]] = result
+
+        with conn:
+            conn.executemany(
+                "UPDATE job_items SET result = ?, data = NULL WHERE job_id = ? AND position = ?",
+                [(json.dumps(result), job_id, position) for position, result in results.items()]
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def _fail(self, job_id, error):
+
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                (time.time(), error, job_id)
+            )
+            conn.execute("UPDATE job_items SET data = NULL WHERE job_id = ?", (job_id,))
+
+    def _purge(self):
+
+        cutoff = time.time() - self.retention_seconds
+        with self._connection() as conn:
+            conn.execute(
+                "DELETE FROM job_items WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?)",
+                (cutoff,)
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (cutoff,)
+            )
+
+    def _worker(self):
+
+        last_purge = 0.0
+
+        while True:
+
+            if not self.predictor.is_ready:
+                time.sleep(0.5)
+                continue
+
+            try:
+                if time.time() - last_purge > 600:
+                    self._purge()
+                    last_purge = time.time()
+
+                job_id = self._claim()
+            except sqlite3.Error as e:
+                print(f"Job queue error: {e}", flush=True)
+                time.sleep(1)
+                continue
+
+            if job_id is None:
+                with self._done:
+                    self._done.wait(0.5)
+                continue
+
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}", flush=True)
+                self._fail(job_id, str(e))
+
+            with self._done:
+                self._done.notify_all()
@@ -0,0 +1,190 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+# Versioned model manifest (model/manifest.json). One JSON file describes
+# everything a worker needs to serve a model consistently:
+#
+#   {
+#     "version": "20261017-101500",
+#     "backend": "keras",                  # keras, saved_model or tflite
+#     "path": "model.keras",               # relative to the manifest
+#     "class_names": ["Apple___Apple_scab", ...],
+#     "input_size": [128, 128],            # height, width
+#     "normalization": "0-255",            # pixel range the artifact expects
+#     "sha256": "...",                     # of the artifact file/directory
+#     "cascade": [...]                     # optional, see utils/cascade.py
+#   }
+#
+# Deploying a model means copying the artifact next to the manifest and then
+# replacing the manifest (write_manifest does this atomically); running
+# workers notice the change and swap the new model in (Predictor.reload).
+
+MANIFEST_KEYS = ("version", "backend", "path", "class_names", "input_size", "normalization", "sha256")
+CASCADE_KEYS = ("path", "threshold", "sha256")
+
+# range -> (scale, offset) applied to 0-255 pixels; None keeps them as is
+NORMALIZATIONS = {
+    "0-255": None,
+    "0-1": (1.0 / 255.0, 0.0),
+    "-1-1": (1.0 / 127.5, -1.0),
+}
+
+
+def artifact_digest(path):
+    """sha256 hex of a model file, or of every file (sorted) under a directory."""
+
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+
+    digest = hashlib.sha256()
+    for name in paths:
+        with open(name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def guess_backend(path):
+    if os.path.isdir(path):
+        return "saved_model"
+    return "tflite" if path.endswith(".tflite") else "keras"
+
+
+def _verify(path, sha256):
+    if not os.path.exists(path):
+        raise ValueError(f"Model artifact {path} not found")
+    digest = artifact_digest(path)
+    if digest != sha256:
+        raise ValueError(f"Checksum mismatch for {path} "
+                         f"(manifest {sha256[:12]}, file {digest[:12]})")
+
+
+def read_manifest(manifest_path, verify=True):
+    """
+    Load and validate a manifest. The returned dict has `path` (and every
+    cascade stage's `path`) resolved to an absolute path and cascade stages
+    filled in with the manifest's backend and normalization where they
+    leave them out. Raises ValueError on a malformed manifest or, with
+    `verify`, when an artifact does not match its checksum.
+    """
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    missing = [key for key in MANIFEST_KEYS if key not in manifest]
+    if missing:
+        raise ValueError(f"Manifest {manifest_path} is missing {', '.join(missing)}")
+
+    if manifest["normalization"] not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization {manifest['normalization']!r}")
+
+    if len(manifest["input_size"]) != 2:
+        raise ValueError("input_size must be [height, width]")
+
+    if not manifest["class_names"]:
+        raise ValueError("Manifest has no class names")
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    manifest["path"] = os.path.join(manifest_dir, manifest["path"])
+
+    stages = manifest.setdefault("cascade", [])
+    for stage in stages:
+        missing = [key for key in CASCADE_KEYS if key not in stage]
+        if missing:
+            raise ValueError(f"Cascade stage is missing {', '.join(missing)}")
+        if not 0 < stage["threshold"] <= 1:
+            raise ValueError(f"Cascade threshold {stage['threshold']} is not in (0, 1]")
+        stage.setdefault("backend", manifest["backend"])
+        stage.setdefault("normalization", manifest["normalization"])
+        if stage["normalization"] not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization {stage['normalization']!r}")
+        stage["path"] = os.path.join(manifest_dir, stage["path"])
+
+    if verify:
+        _verify(manifest["path"], manifest["sha256"])
+        for stage in stages:
+            _verify(stage["path"], stage["sha256"])
+
+    return manifest
+
+
+def write_manifest(manifest_path, artifact_path, class_names, input_size,
+                   backend="keras", normalization="0-255", version=None, cascade=()):
+    """
+    Write a manifest for `artifact_path`, replacing any previous one
+    atomically. `cascade` lists (artifact path, threshold) for the cheaper
+    models tried first, cheapest first.
+    """
+
+    if normalization not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization {normalization!r}")
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    manifest = {
+        "version": version or time.strftime("%Y%m%d-%H%M%S"),
+        "backend": backend,
+        "path": os.path.relpath(os.path.abspath(artifact_path), manifest_dir),
+        "class_names": list(class_names),
+        "input_size": [int(input_size[0]), int(input_size[1])],
+        "normalization": normalization,
+        "sha256": artifact_digest(artifact_path),
+    }
+
+    if cascade:
+        manifest["cascade"] = [
+            {
+                "path": os.path.relpath(os.path.abspath(path), manifest_dir),
+                "backend": guess_backend(path),
+                "threshold": float(threshold),
+                "sha256": artifact_digest(path),
+            }
+            for path, threshold in cascade
+        ]
+
+    tmp_path = f"{manifest_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a model manifest for an existing artifact.")
+    parser.add_argument("artifact", help="Model file or directory")
+    parser.add_argument("--manifest", default=os.path.join("model", "manifest.json"))
+    parser.add_argument("--class-names", default=os.path.join("model", "class_names.json"),
+                        help="JSON list of class names")
+    parser.add_argument("--backend", choices=["keras", "saved_model", "tflite"], default="keras")
+    parser.add_argument("--input-size", type=int, nargs=2, metavar=("HEIGHT", "WIDTH"),
+                        help="Defaults to DRCROP_IMAGE_SIZE")
+    parser.add_argument("--normalization", choices=list(NORMALIZATIONS), default="0-255")
+    parser.add_argument("--version", help="Defaults to a timestamp")
+    parser.add_argument("--cascade", nargs=2, action="append", default=[], metavar=("ARTIFACT", "THRESHOLD"),
+                        help="Cheaper model tried first; answers when its confidence reaches THRESHOLD "
+                             "(repeat, cheapest first)")
+    args = parser.parse_args()
+
+    from utils import config
+
+    with open(args.class_names) as f:
+        class_names = json.load(f)
+
+    manifest = write_manifest(
+        args.manifest, args.artifact, class_names,
+        args.input_size or (config.IMAGE_SIZE, config.IMAGE_SIZE),
+        backend=args.backend, normalization=args.normalization, version=args.version,
+        cascade=[(path, float(threshold)) for path, threshold in args.cascade]
+    )
+    print(f"Wrote {args.manifest} (version {manifest['version']}, sha256 {manifest['sha256'][:12]})")
+
+
+if __name__ == "__main__":
+    main()
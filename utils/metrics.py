@@ -0,0 +1,192 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus-style metrics (text exposition format 0.0.4) without
+# extra dependencies. Updates are a dict lookup plus an add under a lock,
+# cheap enough to sit on every request. Each process keeps its own values,
+# so with several gunicorn workers every scrape sees one worker.
+
+# seconds; spans sub-millisecond decode up to slow batched inference
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+            out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]))
+            out.append((f"{self.name}_sum", key, series[-2]))
+            out.append((f"{self.name}_count", key, series[-1]))
+        return out
+
+
+class CallbackMetric:
+    """Metric whose samples are read at scrape time, e.g. cache statistics."""
+
+    def __init__(self, name, help, type, callback):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.callback = callback  # () -> [(labels dict, value), ...]
+
+    def samples(self):
+        try:
+            return [(self.name, _label_key(labels), value) for labels, value in self.callback()]
+        except Exception:
+            return []
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # idempotent, so modules can declare metrics at import time
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def gauge(self, name, help):
+        return self.register(Gauge(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def callback(self, name, help, type, callback):
+        with self._lock:
+            self._metrics[name] = CallbackMetric(name, help, type, callback)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Shared request-path metrics
+STAGE_SECONDS = REGISTRY.histogram(
+    "drcrop_stage_seconds",
+    "Time spent in each stage of the prediction path"
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "drcrop_request_seconds",
+    "End-to-end latency per route"
+)
+PREDICTIONS = REGISTRY.counter(
+    "drcrop_predictions_total",
+    "Prediction outcomes (success, unknown_disease, low_quality, error)"
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "drcrop_inference_batch_size",
+    "Images per forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+def stage(name):
+    """Context manager timing one stage into drcrop_stage_seconds."""
+    return STAGE_SECONDS.time(stage=name)
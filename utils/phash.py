@@ -0,0 +1,147 @@
+import threading
+
+import numpy as np
+
+# ITU-R BT.601 luma weights, matching PIL's convert("L")
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _block_mean(a, out_h, out_w):
+    """Area-average a 2-D array down to (out_h, out_w) without PIL."""
+
+    ys = np.linspace(0, a.shape[0], out_h + 1).astype(np.intp)
+    xs = np.linspace(0, a.shape[1], out_w + 1).astype(np.intp)
+
+    sums = np.add.reduceat(np.add.reduceat(a, ys[:-1], axis=0), xs[:-1], axis=1)
+    return sums / np.outer(np.diff(ys), np.diff(xs))
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of a preprocessed image.
+
+    `image` is the (H, W, 3) or (1, H, W, 3) array from preprocess_image.
+    The luma plane is area-averaged to hash_size x (hash_size + 1) and each
+    bit records whether a cell is brighter than its left neighbour, which
+    survives re-encoding, rescaling and small exposure changes.
+    """
+
+    image = np.asarray(image, dtype=np.float32)
+    if image.ndim == 4:
+        image = image[0]
+
+    gray = image[..., :3] @ LUMA
+    cells = _block_mean(gray, hash_size, hash_size + 1)
+    bits = cells[:, 1:] > cells[:, :-1]
+
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def chroma(image, grid=4):
+    """
+    Colour signature that complements the luma-only dHash: the mean red and
+    green chromaticity (R / (R+G+B), G / (R+G+B)) of each cell of a grid x
+    grid split, as a flat float32 vector. Chromaticity ignores exposure, so
+    a re-photographed leaf keeps its signature while a green leaf and a
+    yellowed or browned one with the same vein pattern do not.
+    """
+
+    image = np.asarray(image, dtype=np.float32)
+    if image.ndim == 4:
+        image = image[0]
+
+    cells = np.stack([_block_mean(image[..., c], grid, grid) for c in range(3)], axis=-1)
+    total = np.maximum(cells.sum(axis=-1, keepdims=True), 1e-6)
+    return (cells[..., :2] / total).reshape(-1)
+
+
+def popcount64(values):
+    """Vectorized bit count of a uint64 array."""
+
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+
+    x = values - ((values >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+class NearDuplicateIndex:
+    """
+    Ring buffer of the most recent `capacity` image hashes, colour
+    signatures and their results.
+
+    A lookup XORs the query against every stored hash and counts bits in one
+    vectorized pass (~0.1-0.6 ms for 100k entries), then compares the colour
+    signature of the few entries within `max_distance` bits, returning the
+    closest result whose chromaticity differs by at most `max_chroma` in
+    every cell.
+    """
+
+    def __init__(self, capacity=10000, max_distance=4, max_chroma=0.03, grid=4):
+
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.max_chroma = max_chroma
+
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._chromas = np.zeros((capacity, grid * grid * 2), dtype=np.float32)
+        self._results = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, image_hash, image_chroma):
+        """Return (result, distance) for the nearest matching entry, or (None, None)."""
+
+        with self._lock:
+
+            if self._size:
+                distances = popcount64(self._hashes[:self._size] ^ image_hash)
+                slots = np.flatnonzero(distances <= self.max_distance)
+
+                if len(slots):
+                    shift = np.abs(self._chromas[slots] - image_chroma).max(axis=1)
+                    slots = slots[shift <= self.max_chroma]
+
+                if len(slots):
+                    slot = int(slots[np.argmin(distances[slots])])
+                    self.hits += 1
+                    return self._results[slot], int(distances[slot])
+
+            self.misses += 1
+            return None, None
+
+    def add(self, image_hash, image_chroma, result):
+
+        with self._lock:
+            self._hashes[self._next] = image_hash
+            self._chromas[self._next] = image_chroma
+            self._results[self._next] = result
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+
+        with self._lock:
+            self._results = [None] * self.capacity
+            self._size = 0
+            self._next = 0
+
+    def stats(self):
+
+        with self._lock:
+            return {
+                "entries": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,17 +1,113 @@
+import io
+import atexit
 import os
 import json
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import tensorflow as tf
+from utils import config
+from utils.admission import AdmissionController, Overloaded
+from utils.backends import KerasBackend, import_tensorflow, load_backend
+from utils.batcher import MicroBatcher
+from utils.cascade import CascadeStage, ModelCascade
+from utils.cache import PredictionCache, SqliteCacheStore
 from utils.disease_info import DISEASE_DATABASE
-from utils.preprocess import preprocess_image
+from utils.embeddings import EmbeddingStore
+from utils.inference_server import RemoteBackend
+from utils.manifest import NORMALIZATIONS, artifact_digest, read_manifest
+from utils.metrics import BATCH_SIZE, PREDICTIONS, REGISTRY, stage
+from utils.phash import NearDuplicateIndex, chroma, dhash
+from utils.preprocess import preprocess_image, preprocess_into
+from utils.quality import QualityGate
+from utils.tiling import aggregate_tiles, count_tiles, iter_tile_rows
+
+
+MODEL_RELOADS = REGISTRY.counter(
+    "drcrop_model_reloads_total",
+    "Background model reloads by outcome (swapped, failed)"
+)
+
+
+class LoadedModel:
+    """
+    One model version: backend, class list, input shape, normalization,
+    optional cascade of cheaper models and its own micro-batcher. Predictor
+    replaces the whole object in a single assignment, and every request
+    reads `predictor.active` once, so requests that started on the previous
+    version finish on it.
+    """
+
+    def __init__(self, backend=None, class_names=None, input_shape=None,
+                 version="unloaded", artifact_path=None, model=None,
+                 normalization=None, manifest=None):
+
+        self.backend = backend
+        self.class_names = list(class_names or [])
+        self.input_shape = input_shape or (config.IMAGE_SIZE, config.IMAGE_SIZE, 3)
+        self.version = version
+        self.artifact_path = artifact_path
+        self.model = model
+        self.normalization = normalization  # (scale, offset) on 0-255 pixels, or None
+        self.manifest = manifest
+        self.manifest_stamp = None
+        self.batcher = None
+        self.cascade = None
+        self.embedding_dim = None  # set when the embedding store is on
+
+    def predict(self, images):
+
+        if self.cascade is not None:
+            return self.cascade.predict(images)
+
+        return self.predict_full(images)
+
+    def predict_full(self, images):
+        return normalized_predict(self.backend, self.normalization, images)
+
+    def predict_with_embeddings(self, images):
+
+        # the full model only: cascade stages have their own feature spaces
+        images = normalize(images, self.normalization)
+        return self.backend.predict_with_embeddings(images)
+
+
+def normalize(images, normalization):
+
+    # images hold 0-255 pixels; rescale them to the range the artifact expects
+    if normalization is None:
+        return images
+
+    scale, offset = normalization
+    return images * np.float32(scale) + np.float32(offset)
+
+
+def normalized_predict(backend, normalization, images):
+    return backend.predict(normalize(images, normalization))
 
 
 class Predictor:
+    """
+    One instance per process, shared by all request threads (gthread
+    workers, job workers, the inference server's handler threads). Request
+    methods only read `self.active`, which is replaced atomically; the
+    cache, near-duplicate index, batcher, metrics and TFLite interpreter
+    guard their own state.
+    """
+
+    def __init__(self, background=False):
 
-    def __init__(self):
+        # loading -> warming -> ready, or failed; reported by /readyz
+        self.state = "loading"
+        self.boot_timings = {}
 
-        self.model = None
-        self.class_names = []
+        # the model serving requests; replaced as a whole by reload()
+        self.active = LoadedModel()
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+        self._failed_stamp = None
 
         # absolute base directory
         self.BASE_DIR = os.path.dirname(
@@ -31,15 +127,485 @@ class Predictor:
             "class_names.json"
         )
 
+        # artifacts written by convert_model.py for the other backends
+        self.backend_paths = {
+            "saved_model": os.path.join(self.BASE_DIR, "model", "saved_model_v1"),
+            "tflite": os.path.join(self.BASE_DIR, "model", "model_int8.tflite"),
+        }
+
         print("\n=== Predictor Init ===")
         print("Model path:", self.model_path)
         print("Model exists:", os.path.exists(self.model_path))
         print("======================\n")
 
-        self.load_resources()
+        self.preprocess_pool = ThreadPoolExecutor(
+            max_workers=config.PREPROCESS_WORKERS,
+            thread_name_prefix="drcrop-preprocess"
+        )
+
+        self.admission = AdmissionController(
+            max_queue=config.ADMISSION_MAX_QUEUE,
+            deadline_seconds=config.REQUEST_DEADLINE_SECONDS
+        )
+
+        self.cache = None
+        if config.CACHE_MAX_ENTRIES > 0:
+            store = None
+            if config.CACHE_PATH:
+                store = SqliteCacheStore(
+                    config.CACHE_PATH,
+                    max_entries=config.CACHE_PATH_MAX_ENTRIES
+                )
+            self.cache = PredictionCache(
+                max_entries=config.CACHE_MAX_ENTRIES,
+                ttl_seconds=config.CACHE_TTL_SECONDS,
+                store=store
+            )
+
+        self.quality_gate = QualityGate(
+            mode=config.QUALITY_GATE,
+            min_brightness=config.QUALITY_MIN_BRIGHTNESS,
+            max_brightness=config.QUALITY_MAX_BRIGHTNESS,
+            min_sharpness=config.QUALITY_MIN_SHARPNESS,
+            min_green_fraction=config.QUALITY_MIN_GREEN_FRACTION
+        )
+
+        self.embeddings = None
+        if config.EMBEDDINGS:
+            self.embeddings = EmbeddingStore(config.EMBEDDING_DIR, block_rows=config.EMBEDDING_BLOCK_ROWS)
+
+        self.near_duplicates = None
+        if config.NEAR_DUP_CAPACITY > 0:
+            self.near_duplicates = NearDuplicateIndex(
+                capacity=config.NEAR_DUP_CAPACITY,
+                max_distance=config.NEAR_DUP_MAX_DISTANCE,
+                max_chroma=config.NEAR_DUP_MAX_CHROMA
+            )
+
+        self.register_metrics()
+
+        if background:
+            self.load_async()
+        else:
+            self.load()
+
+
+    def register_metrics(self):
+
+        # read at scrape time from the live objects
+        REGISTRY.callback(
+            "drcrop_model_ready",
+            "1 once the model is loaded and warmed up",
+            "gauge",
+            lambda: [({"state": self.state, "version": self.model_version}, int(self.is_ready))]
+        )
+
+        REGISTRY.callback(
+            "drcrop_inference_queue_depth",
+            "Images admitted and waiting for or in the model",
+            "gauge",
+            lambda: [({}, self.admission.depth)]
+        )
+
+        REGISTRY.callback(
+            "drcrop_inference_estimated_wait_seconds",
+            "Estimated time for the current backlog to drain",
+            "gauge",
+            lambda: [({}, round(self.admission.estimated_wait(), 6))]
+        )
+
+        REGISTRY.callback(
+            "drcrop_requests_shed_total",
+            "Requests refused or dropped by admission control, by reason",
+            "counter",
+            lambda: [({"reason": reason}, count) for reason, count in self.admission.shed.items()]
+        )
+
+        if self.cache is not None:
+            REGISTRY.callback(
+                "drcrop_cache_lookups_total",
+                "Prediction cache lookups by result",
+                "counter",
+                lambda: [
+                    ({"result": "hit"}, self.cache.hits),
+                    ({"result": "miss"}, self.cache.misses),
+                ]
+            )
+            REGISTRY.callback(
+                "drcrop_cache_entries",
+                "Results held in this process's prediction cache",
+                "gauge",
+                lambda: [({}, self.cache.stats()["entries"])]
+            )
+            REGISTRY.callback(
+                "drcrop_cache_evictions_total",
+                "Prediction cache entries dropped to stay within DRCROP_CACHE_MAX_ENTRIES",
+                "counter",
+                lambda: [({}, self.cache.stats()["evictions"])]
+            )
+
+        if self.embeddings is not None:
+            REGISTRY.callback(
+                "drcrop_embedding_cases",
+                "Cases in the active model's embedding index",
+                "gauge",
+                lambda: [({}, len(index)) for index in [self.embedding_index()] if index is not None]
+            )
+
+        if self.near_duplicates is not None:
+            REGISTRY.callback(
+                "drcrop_near_duplicate_lookups_total",
+                "Perceptual-hash index lookups by result",
+                "counter",
+                lambda: [
+                    ({"result": "hit"}, self.near_duplicates.hits),
+                    ({"result": "miss"}, self.near_duplicates.misses),
+                ]
+            )
+            REGISTRY.callback(
+                "drcrop_near_duplicate_entries",
+                "Perceptual hashes held in this process's near-duplicate index",
+                "gauge",
+                lambda: [({}, self.near_duplicates.stats()["entries"])]
+            )
+
+
+    @contextmanager
+    def timed(self, phase):
+
+        # boot-phase timings in ms, logged once loading finishes
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.boot_timings[phase] = round((time.perf_counter() - start) * 1000, 1)
+
+
+    def load_async(self):
+
+        # keep imports fast so the web server binds its port immediately
+        threading.Thread(
+            target=self.load,
+            name="drcrop-model-loader",
+            daemon=True
+        ).start()
+
+
+    def load(self):
+
+        self.state = "loading"
+
+        with self._reload_lock, self.timed("total"):
+
+            loaded = None
+
+            try:
+                loaded = self.load_resources()
+            except Exception as e:
+                print(f"Model load error: {e}", flush=True)
+
+            if loaded is None:
+                self.state = "failed"
+            else:
+                self.state = "warming"
+                with self.timed("warmup"):
+                    self.warmup(loaded)
+                self.activate(loaded)
+                self.state = "ready"
+
+        print(f"Predictor {self.state}; boot timings (ms): {self.boot_timings}", flush=True)
+
+        # also after a failed load: a corrected manifest brings the model up
+        self.watch_for_updates()
+
+
+    def reload(self):
+        """
+        Load and warm the current model version next to the active one, then
+        swap it in. The old version keeps serving until the swap (and
+        finishes its in-flight requests after it); on any error it stays
+        active. Returns True if a new version was swapped in.
+        """
+
+        with self._reload_lock:
+
+            start = time.perf_counter()
+            stamp = self.manifest_stamp()
+
+            try:
+                loaded = self.load_resources()
+                if loaded is None:
+                    raise RuntimeError("no model could be loaded")
+                self.warmup(loaded)
+            except Exception as e:
+                MODEL_RELOADS.inc(outcome="failed")
+                self._failed_stamp = stamp
+                print(f"Model reload failed, keeping version {self.model_version}: {e}", flush=True)
+                return False
+
+            previous = self.model_version
+            self.activate(loaded)
+            self.state = "ready"
+
+            MODEL_RELOADS.inc(outcome="swapped")
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Model swapped {previous} -> {loaded.version} ({elapsed:.0f} ms load + warm-up)", flush=True)
+            return True
+
+
+    def activate(self, loaded):
+
+        previous, self.active = self.active, loaded
+
+        # the old batcher answers what it has queued, then its thread exits
+        # and the previous model can be garbage collected
+        if previous.batcher is not None and previous is not loaded:
+            previous.batcher.close()
+
+        # hashes remembered for the previous model are no longer valid
+        if self.near_duplicates is not None:
+            self.near_duplicates.clear()
+
+
+    def watch_for_updates(self):
+
+        # one polling thread per process (threads do not survive a fork)
+        if config.MANIFEST_POLL_SECONDS <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+
+        threading.Thread(
+            target=self._watch_loop,
+            name="drcrop-model-watch",
+            daemon=True
+        ).start()
+
+
+    def _watch_loop(self):
+
+        while True:
+
+            time.sleep(config.MANIFEST_POLL_SECONDS)
+
+            try:
+                changed = self.model_changed()
+            except Exception as e:
+                print(f"Model update check failed: {e}", flush=True)
+                continue
+
+            if changed:
+                self.reload()
+
+
+    def model_changed(self):
+
+        # the manifest was replaced since the active model was loaded (a
+        # manifest that failed to load is retried only once it changes again)
+        stamp = self.manifest_stamp()
+        return stamp is not None and stamp not in (self.active.manifest_stamp, self._failed_stamp)
+
+
+    @staticmethod
+    def manifest_stamp():
+
+        try:
+            st = os.stat(config.MODEL_MANIFEST)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+
+    @property
+    def is_ready(self):
+        return self.state == "ready"
+
+
+    # attributes of the active model (read-only; swapped together)
+
+    @property
+    def backend(self):
+        return self.active.backend
+
+    @property
+    def model(self):
+        return self.active.model
+
+    @property
+    def artifact_path(self):
+        return self.active.artifact_path
+
+    @property
+    def class_names(self):
+        return self.active.class_names
+
+    @property
+    def model_version(self):
+        return self.active.version
+
+    @property
+    def input_shape(self):
+        # shape of one preprocess_image output (without the batch axis)
+        return self.active.input_shape
+
+    @property
+    def batcher(self):
+        return self.active.batcher
+
+
+    def make_batcher(self, loaded):
+
+        # concurrent predict() calls share one batched forward pass; with the
+        # embedding store on, each caller gets (probabilities, embedding)
+        embeddings = loaded.embedding_dim is not None
+        return MicroBatcher(
+            lambda images: self.predict_batch(images, loaded, embeddings=embeddings),
+            max_batch_size=config.MAX_BATCH_SIZE,
+            max_wait_ms=config.MAX_BATCH_WAIT_MS
+        )
+
+
+    def compute_model_version(self, backend, class_names, artifact_path):
+
+        # hash of backend + artifact + class list; part of every cache key
+        digest = hashlib.sha256(json.dumps(class_names).encode("utf-8"))
+        digest.update(backend.name.encode("utf-8"))
+        digest.update(artifact_digest(artifact_path).encode("utf-8"))
+
+        return digest.hexdigest()[:16]
 
 
     def load_resources(self):
+        """Load (but do not activate) the model described by the manifest, or
+        the default artifacts when there is none. Returns a LoadedModel or None."""
+
+        stamp = self.manifest_stamp()
+
+        if stamp is not None:
+            loaded = self.load_from_manifest(config.MODEL_MANIFEST)
+        else:
+            loaded = self.load_default()
+
+        if loaded is None:
+            return None
+
+        loaded.manifest_stamp = stamp
+        if self.embeddings is not None:
+            self.enable_embeddings(loaded)
+        loaded.batcher = self.make_batcher(loaded)
+
+        print(f"Model version: {loaded.version}, input shape {loaded.input_shape}", flush=True)
+        return loaded
+
+
+    def enable_embeddings(self, loaded):
+
+        enable = getattr(loaded.backend, "enable_embeddings", None)
+        loaded.embedding_dim = enable() if enable is not None else None
+
+        if loaded.embedding_dim is None:
+            print(f"Embeddings not available for the {loaded.backend.name} model; "
+                  "similar-case search is off", flush=True)
+        else:
+            print(f"Embedding store on ({loaded.embedding_dim}-d)", flush=True)
+
+
+    def embedding_index(self, loaded=None):
+        """The active (or `loaded`) model's EmbeddingIndex, or None."""
+
+        loaded = loaded or self.active
+        if self.embeddings is None or loaded.embedding_dim is None:
+            return None
+        return self.embeddings.index(loaded.version, loaded.embedding_dim)
+
+
+    def add_case(self, loaded, embedding, result):
+
+        # best effort: a full disk must not fail the prediction itself
+        try:
+            return self.embedding_index(loaded).add(embedding, {
+                "disease_name": result["disease_name"],
+                "crop": result["crop"],
+                "confidence_score": result["confidence_score"],
+            })
+        except Exception as e:
+            print("Embedding store error:", e)
+            return None
+
+
+    def load_from_manifest(self, manifest_path):
+
+        with self.timed("read_manifest"):
+            manifest = read_manifest(manifest_path)
+
+        print(f"Manifest {manifest_path}: version {manifest['version']}, "
+              f"{manifest['backend']} model {manifest['path']}", flush=True)
+
+        with self.timed("load_model"):
+            backend, model, artifact_path = self.load_backend(manifest["backend"], manifest["path"])
+
+        if backend is None:
+            return None
+
+        input_shape = tuple(manifest["input_size"]) + (3,)
+        if backend.input_shape is not None and backend.input_shape != input_shape:
+            raise ValueError(f"Manifest input size {input_shape} does not match the model ({backend.input_shape})")
+
+        loaded = LoadedModel(
+            backend,
+            manifest["class_names"],
+            input_shape,
+            # the checksum keeps cache keys apart if a version name is reused
+            version=f"{manifest['version']}-{manifest['sha256'][:8]}",
+            artifact_path=artifact_path,
+            model=model,
+            normalization=NORMALIZATIONS[manifest["normalization"]],
+            manifest=manifest
+        )
+
+        if config.CASCADE_ENABLED and manifest["cascade"]:
+            with self.timed("load_cascade"):
+                loaded.cascade = self.load_cascade(manifest["cascade"], loaded)
+            # cascade answers differ from the full model's: separate cache keys
+            stages = json.dumps([(stage["sha256"], stage["threshold"]) for stage in manifest["cascade"]])
+            loaded.version += "-c" + hashlib.sha256(stages.encode("utf-8")).hexdigest()[:6]
+
+        return loaded
+
+
+    def load_cascade(self, stages, loaded):
+        """Build the ModelCascade for the manifest's `cascade` list, ending with `loaded`."""
+
+        cascade = []
+
+        for stage in stages:
+
+            backend, _, _ = self.load_backend(stage["backend"], stage["path"])
+
+            if backend is None:
+                raise ValueError(f"Cascade model {stage['path']} could not be loaded")
+
+            if backend.input_shape is not None and backend.input_shape != loaded.input_shape:
+                raise ValueError(f"Cascade model {stage['path']} input {backend.input_shape} "
+                                 f"does not match the model ({loaded.input_shape})")
+
+            normalization = NORMALIZATIONS[stage["normalization"]]
+            cascade.append(CascadeStage(
+                os.path.splitext(os.path.basename(stage["path"].rstrip(os.sep)))[0],
+                lambda images, backend=backend, normalization=normalization:
+                    normalized_predict(backend, normalization, images),
+                threshold=stage["threshold"]
+            ))
+
+            print(f"Cascade stage {cascade[-1].name}: answers at confidence >= {stage['threshold']}", flush=True)
+
+        cascade.append(CascadeStage("full", loaded.predict_full))
+
+        return ModelCascade(cascade)
+
+
+    def load_default(self):
+
+        class_names = []
 
         # Load class names
         try:
@@ -47,7 +613,7 @@ class Predictor:
             if os.path.exists(self.class_names_path):
 
                 with open(self.class_names_path, "r") as f:
-                    self.class_names = json.load(f)
+                    class_names = json.load(f)
 
                 print("Class names loaded")
 
@@ -60,22 +626,109 @@ class Predictor:
             print("Class names load error:", e)
 
 
+        # Load model through the configured backend
+        with self.timed("load_model"):
+            backend, model, artifact_path = self.load_backend(config.MODEL_BACKEND)
+
+        if backend is None:
+            return None
+
+        with self.timed("model_version"):
+            version = self.compute_model_version(backend, class_names, artifact_path)
+
+        return LoadedModel(
+            backend,
+            class_names,
+            backend.input_shape,
+            version=version,
+            artifact_path=artifact_path,
+            model=model
+        )
+
+
+    def load_backend(self, name, artifact_path=None):
+        """Return (backend or None, keras model or None, artifact path)."""
+
+        if name == "keras":
+
+            model, artifact_path = self.load_keras_model(
+                artifact_path or config.MODEL_ARTIFACT or self.model_path
+            )
+
+            if model is None:
+                return None, None, artifact_path
+
+            backend = KerasBackend(
+                model,
+                compiled=config.SERVING_FUNCTION,
+                jit_compile=config.XLA_JIT,
+                batch_buckets=config.WARMUP_BATCH_SIZES
+            )
+            return backend, model, artifact_path
+
+        artifact_path = (
+            artifact_path
+            or config.MODEL_ARTIFACT
+            or self.backend_paths.get(name, "")
+        )
+
+        try:
+            print(f"Loading {name} model from: {artifact_path}", flush=True)
+            backend = load_backend(name, artifact_path, num_threads=config.TF_INTRA_OP_THREADS or None)
+            print(f"{name.upper()} MODEL LOADED SUCCESSFULLY", flush=True)
+        except Exception as e:
+            print(f"CRITICAL MODEL LOAD ERROR: {e}", flush=True)
+            backend = None
+
+        return backend, None, artifact_path
+
+    def warmup(self, loaded):
+
+        # trace / compile every batch shape we serve before the first request
+        for size in config.WARMUP_BATCH_SIZES:
+            try:
+                start = time.perf_counter()
+                images = np.zeros((size,) + loaded.input_shape, dtype=np.float32)
+                if loaded.embedding_dim is not None:
+                    loaded.predict_with_embeddings(images)
+                elif loaded.cascade is not None:
+                    loaded.cascade.warmup(images)
+                else:
+                    loaded.predict(images)
+                # seeds the admission control cost estimate
+                self.admission.record_batch(time.perf_counter() - start, size)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"Warm-up batch {size}: {elapsed:.1f} ms", flush=True)
+            except Exception as e:
+                print(f"Warm-up batch {size} failed: {e}", flush=True)
+
+    def load_keras_model(self, artifact_path):
+        """Return (model or None, path actually loaded)."""
+
+        # imported here (lazily, off the request path) so the app binds its
+        # port quickly and inference-server clients never load TensorFlow
+        with self.timed("import_tensorflow"):
+            tf = import_tensorflow()
+
+        model = None
+
         # Load model with standard Keras 3 loading (Matching local environment)
         try:
-            if os.path.exists(self.model_path):
-                print(f"Loading model from: {self.model_path}", flush=True)
+            if os.path.exists(artifact_path):
+                print(f"Loading model from: {artifact_path}", flush=True)
                 # Keras 3 standard load
-                self.model = tf.keras.models.load_model(self.model_path, compile=False)
+                model = tf.keras.models.load_model(artifact_path, compile=False)
                 print("MODEL LOADED SUCCESSFULLY (STANDARD LOAD)", flush=True)
             else:
                 # Try .h5 fallback
-                h5_path = self.model_path.replace(".keras", ".h5")
+                h5_path = artifact_path.replace(".keras", ".h5")
                 if os.path.exists(h5_path):
+                    artifact_path = h5_path
                     print(f"Loading from H5: {h5_path}", flush=True)
-                    self.model = tf.keras.models.load_model(h5_path, compile=False)
+                    model = tf.keras.models.load_model(h5_path, compile=False)
                     print("H5 MODEL LOADED SUCCESSFULLY", flush=True)
                 else:
-                    print(f"No model file found at {self.model_path}", flush=True)
+                    print(f"No model file found at {artifact_path}", flush=True)
 
         except Exception as e:
             print(f"CRITICAL MODEL LOAD ERROR: {e}", flush=True)
@@ -83,57 +736,483 @@ class Predictor:
             # InputLayer metadata registry issues in some TF 2.16 builds.
             try:
                 print("Fallback: loading with custom_objects...", flush=True)
-                self.model = tf.keras.models.load_model(
-                    self.model_path, 
+                model = tf.keras.models.load_model(
+                    artifact_path, 
                     compile=False,
                     custom_objects={'InputLayer': tf.keras.layers.InputLayer}
                 )
                 print("MODEL LOADED VIA CUSTOM_OBJECTS FALLBACK", flush=True)
             except Exception as e2:
                 print(f"All loading methods failed: {e2}", flush=True)
-                self.model = None
+                model = None
+
+        return model, artifact_path
+
+    def predict_bytes(self, data, alive=None, thumbnail=None):
+        """
+        Raw upload bytes -> result, answered from the cache when possible.
+        Anything else goes through admission control and raises Overloaded
+        when the request is refused, times out in the queue or `alive()`
+        reports that its client has gone. With `thumbnail` (a longest side)
+        a freshly computed result carries a display JPEG in `thumbnail`;
+        cached results do not.
+        """
+
+        loaded = self.active
+        key = None
+
+        if self.cache is not None:
 
-    def predict(self, image_path):
+            key = self.cache.make_key(data, loaded.version)
+            cached = self.cache.get(key)
 
-        if self.model is None:
+            if cached is not None:
+                return dict(cached)
+
+        with self.admission.admit(1) as deadline:
+            result = self.predict(io.BytesIO(data), loaded, deadline=deadline, alive=alive,
+                                  thumbnail=thumbnail)
+
+        if key is not None and "error" not in result:
+            self.cache.put(key, {k: v for k, v in result.items() if k != "thumbnail"})
+
+        return result
+
+    def predict(self, image, loaded=None, deadline=None, alive=None, with_embedding=False,
+                thumbnail=None):
+
+        # image: file path or binary file-like object (see preprocess_image);
+        # with_embedding adds `embedding` and `case_id` when the store is on;
+        # thumbnail adds a display JPEG made from the same decode
+        if not self.is_ready:
+            PREDICTIONS.inc(outcome="error")
             return {"error": "Model not loaded"}
 
-        processed_img = preprocess_image(image_path)
+        # one model version for the whole request, even across a reload
+        loaded = loaded or self.active
+
+        processed_img = preprocess_image(image, loaded.input_shape[1::-1], thumbnail)
 
         if processed_img is None:
+            PREDICTIONS.inc(outcome="error")
             return {"error": "Image preprocessing failed"}
 
+        preview = None
+        if thumbnail:
+            processed_img, preview = processed_img
+
+        quality = self.check_quality(processed_img[0])
+
+        if quality is not None and self.quality_gate.rejects:
+            return self.quality_rejection(quality)
+
+        image_hash, result = None, None
+
+        if not with_embedding:
+            image_hash, result = self.lookup_near_duplicate(processed_img)
+
+        if result is not None:
+            return self.with_thumbnail(self.with_quality(result, quality), preview)
+
         try:
 
-            predictions = self.model.predict(processed_img)
+            predictions = loaded.batcher.predict(processed_img[0], deadline=deadline, alive=alive)
 
-            confidence = float(np.max(predictions))
+            embedding = None
+            if loaded.embedding_dim is not None:
+                predictions, embedding = predictions
 
-            predicted_index = int(np.argmax(predictions))
+            result = self.decode_prediction(predictions, loaded.class_names)
 
-            if confidence >= 0.75 and predicted_index < len(self.class_names):
+            self.remember_near_duplicate(image_hash, result)
 
-                disease_key = self.class_names[predicted_index]
+            if embedding is not None:
+                case_id = self.add_case(loaded, embedding, result)
+                if with_embedding:
+                    result = dict(result, embedding=embedding, case_id=case_id)
 
-            else:
+            return self.with_thumbnail(self.with_quality(result, quality), preview)
 
-                disease_key = "Unknown Disease"
+        except TimeoutError:
 
+            self.admission.count_shed("deadline")
 
-            info = DISEASE_DATABASE.get(
-                disease_key,
-                DISEASE_DATABASE["Unknown Disease"]
-            )
+            raise Overloaded("deadline", self.admission.retry_after())
 
-            return self.format_result(info, confidence)
+        except ConnectionAbortedError:
+
+            self.admission.count_shed("client_gone")
+
+            raise Overloaded("client_gone")
 
         except Exception as e:
 
             print("Prediction error:", e)
 
+            PREDICTIONS.inc(outcome="error")
+
             return {"error": "Prediction failed"}
 
 
+    def check_quality(self, image):
+
+        # the current per-image model cost is what a rejection saves
+        with stage("quality_gate"):
+            return self.quality_gate.check(image, inference_seconds=self.admission.seconds_per_image)
+
+
+    @staticmethod
+    def quality_rejection(quality):
+
+        PREDICTIONS.inc(outcome="low_quality")
+        return {"error": "Image quality too low", "quality": quality}
+
+
+    @staticmethod
+    def with_quality(result, quality):
+
+        # flagged images keep their prediction and carry the feedback
+        return result if quality is None else dict(result, quality=quality)
+
+
+    @staticmethod
+    def with_thumbnail(result, thumbnail):
+        return result if thumbnail is None else dict(result, thumbnail=thumbnail)
+
+
+    def lookup_near_duplicate(self, processed_img):
+        """
+        Return (hash, result) where hash is the (dHash, colour signature)
+        pair and result is a copy of the prediction for a recent image
+        within NEAR_DUP_MAX_DISTANCE bits and NEAR_DUP_MAX_CHROMA, tagged
+        with the `match_distance`, or None when there is no such image.
+        """
+
+        if self.near_duplicates is None:
+            return None, None
+
+        image_hash = dhash(processed_img), chroma(processed_img)
+        result, distance = self.near_duplicates.lookup(*image_hash)
+
+        if result is None:
+            return image_hash, None
+
+        return image_hash, dict(result, match_distance=distance)
+
+
+    def remember_near_duplicate(self, image_hash, result):
+
+        if self.near_duplicates is not None and image_hash is not None:
+            self.near_duplicates.add(*image_hash, result)
+
+
+    def predict_stream(self, uploads):
+        """
+        Classify many uploads, yielding (index, result) as each batch finishes.
+
+        `uploads` is a list of raw image bytes. Cached results are yielded
+        first. Decoding of the rest runs in a thread pool (PIL releases the
+        GIL) and is queued up front, so later images are being decoded while
+        earlier batches are in the model.
+        """
+
+        if not self.is_ready:
+            for index in range(len(uploads)):
+                yield index, {"error": "Model not loaded"}
+            return
+
+        loaded = self.active
+
+        keys = [None] * len(uploads)
+        hashes = [None] * len(uploads)
+        qualities = [None] * len(uploads)
+        misses = []
+
+        for index, data in enumerate(uploads):
+
+            if self.cache is not None:
+                keys[index] = self.cache.make_key(data, loaded.version)
+                cached = self.cache.get(keys[index])
+                if cached is not None:
+                    yield index, dict(cached)
+                    continue
+
+            misses.append(index)
+
+        # every image is decoded straight into its row of one float32 array
+        buffer = np.empty((len(misses),) + loaded.input_shape, dtype=np.float32)
+
+        pending = [
+            self.preprocess_pool.submit(
+                preprocess_into, io.BytesIO(uploads[index]), buffer[position]
+            )
+            for position, index in enumerate(misses)
+        ]
+
+        batch_size = max(1, config.MAX_BATCH_SIZE)
+
+        for start in range(0, len(pending), batch_size):
+
+            end = min(start + batch_size, len(pending))
+            indices = []
+            rows = []
+
+            for position in range(start, end):
+
+                index = misses[position]
+
+                if not pending[position].result():
+                    PREDICTIONS.inc(outcome="error")
+                    yield index, {"error": "Image preprocessing failed"}
+                    continue
+
+                qualities[index] = self.check_quality(buffer[position])
+
+                if qualities[index] is not None and self.quality_gate.rejects:
+                    yield index, self.quality_rejection(qualities[index])
+                    continue
+
+                image_hash, result = self.lookup_near_duplicate(buffer[position])
+
+                if result is not None:
+                    yield index, self.with_quality(result, qualities[index])
+                    continue
+
+                hashes[index] = image_hash
+                indices.append(index)
+                rows.append(position)
+
+            if not rows:
+                continue
+
+            # contiguous slice (no copy) unless some rows were skipped
+            if len(rows) == end - start:
+                images = buffer[start:end]
+            else:
+                images = buffer[rows]
+
+            embeddings = None
+
+            try:
+                if loaded.embedding_dim is not None:
+                    predictions, embeddings = self.predict_batch(images, loaded, embeddings=True)
+                else:
+                    predictions = self.predict_batch(images, loaded)
+            except Exception as e:
+                print("Batch prediction error:", e)
+                PREDICTIONS.inc(len(indices), outcome="error")
+                for index in indices:
+                    yield index, {"error": "Prediction failed"}
+                continue
+
+            for position, (index, row) in enumerate(zip(indices, predictions)):
+                result = self.decode_prediction(row, loaded.class_names)
+                self.remember_near_duplicate(hashes[index], result)
+                if embeddings is not None:
+                    self.add_case(loaded, embeddings[position], result)
+                result = self.with_quality(result, qualities[index])
+                if self.cache is not None:
+                    self.cache.put(keys[index], result)
+                yield index, result
+
+
+    def count_tiles(self, image, stride=None):
+        """
+        Tiles predict_tiled will classify for `image`, from its header, so
+        admission can reserve that many queue slots before decoding. Raises
+        ValueError beyond TILED_MAX_PIXELS (and PIL errors for bad files).
+        """
+
+        tile = self.active.input_shape[0]
+        return count_tiles(image, tile, stride or min(config.TILE_STRIDE, tile), config.TILED_MAX_PIXELS)
+
+
+    def predict_tiled(self, image, stride=None, deadline=None, alive=None):
+        """
+        Classify overlapping model-sized tiles of a large image.
+
+        Tiles are streamed row by row into one preallocated float32 batch of
+        TILE_BATCH_SIZE, so memory beyond the decoded source (at most
+        TILED_MAX_PIXELS) stays at one band of pixels plus one batch. Returns the
+        usual result for the aggregated diagnosis plus a `tiles` section with
+        the per-tile disease map and label counts.
+
+        Before every batch the request's `deadline` (time.monotonic()) and
+        `alive()` probe are checked, as in predict(): past the deadline or
+        with the client gone it raises Overloaded instead of running the
+        remaining forward passes.
+        """
+
+        if not self.is_ready:
+            return {"error": "Model not loaded"}
+
+        loaded = self.active
+        tile = loaded.input_shape[0]
+        stride = stride or min(config.TILE_STRIDE, tile)
+        batch = np.empty((config.TILE_BATCH_SIZE,) + loaded.input_shape, dtype=np.float32)
+        rows = []
+        filled = 0
+        slots = []
+
+        def flush():
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Deadline passed between tile batches")
+            if alive is not None and not alive():
+                raise ConnectionAbortedError("Client disconnected")
+            predictions = self.predict_batch(batch[:filled], loaded)
+            for (row, col), probs in zip(slots, predictions):
+                rows[row][col] = probs
+
+        try:
+
+            for row, tiles in iter_tile_rows(image, tile, stride, config.TILED_MAX_PIXELS):
+
+                rows.append([None] * len(tiles))
+
+                for col, view in enumerate(tiles):
+                    batch[filled] = view
+                    slots.append((row, col))
+                    filled += 1
+
+                    if filled == len(batch):
+                        flush()
+                        filled = 0
+                        slots = []
+
+            if filled:
+                flush()
+
+        except TimeoutError:
+
+            self.admission.count_shed("deadline")
+
+            raise Overloaded("deadline", self.admission.retry_after())
+
+        except ConnectionAbortedError:
+
+            self.admission.count_shed("client_gone")
+
+            raise Overloaded("client_gone")
+
+        except Exception as e:
+
+            print("Tiled prediction error:", e)
+
+            PREDICTIONS.inc(outcome="error")
+
+            return {"error": "Tiled prediction failed"}
+
+        probs = np.array(rows, dtype=np.float32)
+        disease_key, confidence, tile_map, counts, disease_tiles = aggregate_tiles(
+            probs, loaded.class_names,
+            min_disease_tiles=config.TILED_MIN_DISEASE_TILES,
+            min_disease_fraction=config.TILED_MIN_DISEASE_FRACTION
+        )
+
+        PREDICTIONS.inc(outcome="unknown_disease" if disease_key == "Unknown Disease" else "success")
+
+        info = DISEASE_DATABASE.get(disease_key, DISEASE_DATABASE["Unknown Disease"])
+        result = self.format_result(info, confidence)
+        result["tiles"] = {
+            "tile_size": tile,
+            "stride": stride,
+            "rows": len(tile_map),
+            "cols": len(tile_map[0]) if tile_map else 0,
+            "map": tile_map,
+            "counts": counts,
+            "diagnosis_tiles": disease_tiles,
+        }
+        return result
+
+
+    def predict_batch(self, images, loaded=None, embeddings=False):
+
+        # images: float32 array (N, H, W, 3) -> softmax rows (N, num_classes),
+        # or (softmax rows, embedding rows) with `embeddings`
+        loaded = loaded or self.active
+        BATCH_SIZE.observe(len(images))
+
+        start = time.perf_counter()
+        with stage("inference"):
+            if embeddings:
+                predictions = loaded.predict_with_embeddings(images)
+            else:
+                predictions = loaded.predict(images)
+        self.admission.record_batch(time.perf_counter() - start, len(images))
+
+        return predictions
+
+
+    def find_similar(self, data, k=10, alive=None, return_embedding=False):
+        """
+        Classify an upload, add it to the embedding index and return the
+        usual result plus its `case_id` and the `k` most similar past cases
+        (`similar`, best first, each with its cosine `similarity`). Raises
+        Overloaded like predict_bytes.
+        """
+
+        loaded = self.active
+        index = self.embedding_index(loaded)
+
+        if index is None:
+            return {"error": "Embedding store not available"}
+
+        with self.admission.admit(1) as deadline:
+            result = self.predict(io.BytesIO(data), loaded, deadline=deadline, alive=alive,
+                                  with_embedding=True)
+
+        if "error" in result:
+            return result
+
+        embedding = result.pop("embedding")
+        exclude = () if result["case_id"] is None else (result["case_id"],)
+
+        with stage("similar_search"):
+            rows, scores = index.search(embedding, k=k, exclude=exclude)
+            cases = index.cases(rows[0])
+
+        result["similar"] = [
+            dict(cases[row], similarity=round(float(score), 4))
+            for row, score in zip(rows[0].tolist(), scores[0])
+            if row in cases
+        ]
+
+        if return_embedding:
+            result["embedding"] = [round(float(value), 6) for value in embedding]
+
+        return result
+
+
+    def decode_prediction(self, predictions, class_names=None):
+
+        if class_names is None:
+            class_names = self.class_names
+
+        confidence = float(np.max(predictions))
+
+        predicted_index = int(np.argmax(predictions))
+
+        if confidence >= 0.75 and predicted_index < len(class_names):
+
+            disease_key = class_names[predicted_index]
+
+            PREDICTIONS.inc(outcome="success")
+
+        else:
+
+            disease_key = "Unknown Disease"
+
+            PREDICTIONS.inc(outcome="unknown_disease")
+
+
+        info = DISEASE_DATABASE.get(
+            disease_key,
+            DISEASE_DATABASE["Unknown Disease"]
+        )
+
+        return self.format_result(info, confidence)
+
+
     def format_result(self, info, confidence):
 
         confidence_percent = round(confidence * 100, 2)
@@ -172,5 +1251,63 @@ class Predictor:
         }
 
 
-# global instance
-predictor = Predictor()
\ No newline at end of file
+class RemotePredictor(Predictor):
+    """
+    Thin client for the shared inference server (serve_model.py).
+
+    Preprocessing, caching and result formatting still run in this process;
+    only the forward pass is sent to the server, which owns the one copy of
+    the model and batches requests from every worker together.
+    """
+
+    def __init__(self, socket_path, background=False):
+
+        self.socket_path = socket_path
+        self.remote = None
+        super().__init__(background=background)
+
+    def make_batcher(self, loaded):
+
+        # the server batches across workers; do not hold requests back here
+        return MicroBatcher(lambda images: self.predict_batch(images, loaded), max_batch_size=1)
+
+    def load_resources(self):
+
+        if self.remote is None:
+            self.remote = RemoteBackend(
+                self.socket_path,
+                use_shared_memory=config.INFERENCE_SHARED_MEMORY
+            )
+            atexit.register(self.remote.close)
+
+        print(f"Waiting for inference server at {self.socket_path}", flush=True)
+        info = self.remote.wait_until_ready(config.INFERENCE_CONNECT_TIMEOUT)
+
+        if info is None:
+            print("Inference server not available", flush=True)
+            return None
+
+        loaded = LoadedModel(
+            self.remote,
+            info["class_names"],
+            tuple(info["input_shape"]),
+            version=info["model_version"]
+        )
+        loaded.batcher = self.make_batcher(loaded)
+
+        print(f"Connected to inference server ({info['backend']}, version {loaded.version})", flush=True)
+        return loaded
+
+    def model_changed(self):
+
+        # the server swapped its model; pick up its class list and input shape
+        info = self.remote.info() if self.remote is not None else None
+        return bool(info and info.get("ready") and info.get("model_version") != self.model_version)
+
+
+# global instance; the model loads in a background thread unless
+# DRCROP_BACKGROUND_LOAD=0 (see Predictor.state / app.py /readyz)
+if config.INFERENCE_MODE == "client":
+    predictor = RemotePredictor(config.INFERENCE_SOCKET, background=config.BACKGROUND_LOAD)
+else:
+    predictor = Predictor(background=config.BACKGROUND_LOAD)
\ No newline at end of file
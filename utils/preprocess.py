@@ -1,29 +1,133 @@
+import io
+
 import numpy as np
 from PIL import Image
+from utils import config
+from utils.metrics import stage
+
+# Used when the caller does not pass the model's own input size
+DEFAULT_SIZE = (config.IMAGE_SIZE, config.IMAGE_SIZE)
+
+
+def load_rgb(image_path, target_size=DEFAULT_SIZE, thumbnail=None):
+    """
+    Decode an image straight to a (height, width, 3) uint8 RGB array.
+
+    For JPEGs, PIL's draft mode lets libjpeg decode at a reduced DCT scale
+    (1/2, 1/4 or 1/8) that is still at least `target_size`, so a 12 MP phone
+    photo is never fully decoded. Grayscale, palette, CMYK and RGBA inputs
+    are converted to RGB rather than channel-sliced. Images that would still
+    decode to more than UPLOAD_MAX_PIXELS are refused (ValueError).
+
+    With `thumbnail` (a longest side in pixels) returns (array, jpeg), where
+    jpeg is a display copy made from the same decode (see encode_thumbnail),
+    or None if it could not be encoded.
+    """
+    with Image.open(image_path) as img:
+        with stage("decode"):
+            img.draft("RGB", target_size)
+            width, height = img.size  # after draft: what will be decoded
+            if width * height > config.UPLOAD_MAX_PIXELS:
+                raise ValueError(f"Image has {width * height} pixels to decode "
+                                 f"(limit {config.UPLOAD_MAX_PIXELS})")
+            img.load()
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+        preview = None
+        if thumbnail:
+            try:
+                preview = encode_thumbnail(img, thumbnail)
+            except Exception as e:
+                # display only: never fails the prediction
+                print(f"Error in thumbnail: {e}")
+        with stage("resize"):
+            # Bilinear matches the interpolation used by the training pipeline
+            img = img.resize(target_size, resample=Image.BILINEAR)
+            array = np.asarray(img, dtype=np.uint8)
+        return (array, preview) if thumbnail else array
+
+
+def encode_thumbnail(img, max_side=480, quality=80):
+    """
+    JPEG bytes of a decoded RGB PIL image scaled down (never up) to a
+    longest side of `max_side`.
+    """
+    with stage("thumbnail"):
+        scale = max_side / max(img.size)
+        if scale < 1:
+            size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+            img = img.resize(size, resample=Image.BILINEAR, reducing_gap=2.0)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality)
+        return out.getvalue()
+
+
+def thumbnail_jpeg(image_path, max_side=480, quality=80):
+    """
+    Decode an image (JPEGs at reduced scale, like load_rgb) only to
+    re-encode it with encode_thumbnail, for when no decode is at hand.
+    """
+    with Image.open(image_path) as img:
+        img.draft("RGB", (max_side, max_side))
+        if img.size[0] * img.size[1] > config.UPLOAD_MAX_PIXELS:
+            raise ValueError(f"Image has {img.size[0] * img.size[1]} pixels to decode "
+                             f"(limit {config.UPLOAD_MAX_PIXELS})")
+        img.load()
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return encode_thumbnail(img, max_side, quality)
+
 
-def preprocess_image(image_path, target_size=(128, 128)):
+def preprocess_into(image_path, out):
+    """
+    Decode one image into `out`, a preallocated float32 (height, width, 3)
+    slot (e.g. one row of a batch array). Returns False if decoding failed.
+    """
+    try:
+        out[...] = load_rgb(image_path, (out.shape[1], out.shape[0]))
+        return True
+    except Exception as e:
+        print(f"Error in preprocessing: {e}")
+        return False
+
+
+def preprocess_batch(image_paths, target_size=DEFAULT_SIZE, out=None):
+    """
+    Preprocess N images into one float32 (N, height, width, 3) array without
+    per-image concatenation. Returns (batch, ok) where ok[i] is False for
+    images that failed to decode (their rows are zero).
+    """
+    if out is None:
+        out = np.zeros((len(image_paths), target_size[1], target_size[0], 3), dtype=np.float32)
+
+    ok = np.zeros(len(image_paths), dtype=bool)
+    for i, image_path in enumerate(image_paths):
+        ok[i] = preprocess_into(image_path, out[i])
+        if not ok[i]:
+            out[i] = 0
+    return out, ok
+
+
+def preprocess_image(image_path, target_size=DEFAULT_SIZE, thumbnail=None):
     """
     Load and preprocess an image for the model.
+    `image_path` may be a file path or a binary file-like object (e.g. an
+    io.BytesIO holding the uploaded bytes), so uploads can be decoded in memory.
     Steps:
-    1. Open image.
-    2. Resize to target_size.
-    3. Convert to numpy array.
-    4. Normalize pixel values (0-1).
-    5. Expand dimensions to match model input shape (batch_size, height, width, channels).
+    1. Open image (JPEGs are decoded at reduced scale, see load_rgb).
+    2. Convert to RGB and resize to target_size.
+    3. Convert to a float32 numpy array (0-255; the model has a Rescaling layer).
+    4. Expand dimensions to match model input shape (batch_size, height, width, channels).
+    With `thumbnail` returns (array, jpeg) as load_rgb does.
     """
     try:
-        img = Image.open(image_path)
-        img = img.resize(target_size)
-        img_array = np.array(img)
-        
-        # Ensure 3 channels (RGB)
-        if img_array.shape[-1] != 3:
-             img_array = img_array[..., :3] # basic handling for alpha channel
-
+        img_array = load_rgb(image_path, target_size, thumbnail)
+        if thumbnail:
+            img_array, preview = img_array
         img_array = img_array.astype('float32')
         # img_array = img_array / 255.0  # Removed: Model has Rescaling layer
         img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
-        return img_array
+        return (img_array, preview) if thumbnail else img_array
     except Exception as e:
         print(f"Error in preprocessing: {e}")
         return None
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# Tiled inference for large canopy / drone photos: instead of squashing the
+# whole frame to the model's input size, cut it into overlapping windows and
+# classify every window.
+
+
+def tile_offsets(length, tile, stride):
+    """
+    Window start offsets covering [0, length), the last one flush with the
+    edge. A stride larger than the tile would leave unseen gaps (ValueError).
+    """
+
+    if stride > tile:
+        raise ValueError(f"stride {stride} is larger than the {tile} px tile")
+
+    if length <= tile:
+        return [0]
+    offsets = list(range(0, length - tile + 1, stride))
+    if offsets[-1] != length - tile:
+        offsets.append(length - tile)
+    return offsets
+
+
+def count_tiles(image_path, tile=128, stride=128, max_pixels=None):
+    """
+    Number of tiles iter_tile_rows will produce, read from the header only
+    (nothing is decoded). Raises ValueError beyond `max_pixels`. A file-like
+    `image_path` is rewound so it can be read again.
+    """
+
+    with Image.open(image_path) as img:
+        width, height = img.size
+
+    if hasattr(image_path, "seek"):
+        image_path.seek(0)
+
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(f"Image has {width * height} pixels (limit {max_pixels})")
+
+    return len(tile_offsets(width, tile, stride)) * len(tile_offsets(height, tile, stride))
+
+
+def iter_tile_rows(image_path, tile=128, stride=128, max_pixels=None):
+    """
+    Yield (row, tiles) for each row of tiles, top to bottom.
+
+    PIL decodes the whole source on the first crop, so `max_pixels` (checked
+    from the header, before decoding) is what bounds memory. Beyond that
+    only one band of `tile` pixel rows is converted to a NumPy array at a
+    time; `tiles` holds one (tile, tile, 3) uint8 zero-copy view into that
+    band per column, taken from its sliding_window_view. Images smaller
+    than a tile are zero-padded. PIL's own decompression-bomb guard still
+    applies on top of `max_pixels`.
+    """
+
+    with Image.open(image_path) as img:
+
+        width, height = img.size
+        if max_pixels and width * height > max_pixels:
+            raise ValueError(f"Image has {width * height} pixels (limit {max_pixels})")
+
+        xs = tile_offsets(width, tile, stride)
+        ys = tile_offsets(height, tile, stride)
+
+        for row, y in enumerate(ys):
+
+            band = img.crop((0, y, max(width, tile), y + tile))
+            if band.mode != "RGB":
+                band = band.convert("RGB")
+            band = np.asarray(band, dtype=np.uint8)
+
+            windows = np.lib.stride_tricks.sliding_window_view(
+                band, (tile, tile, 3)
+            )[0, :, 0]  # (band width - tile + 1, tile, tile, 3), no copy
+
+            yield row, [windows[x] for x in xs]
+
+
+def aggregate_tiles(probs, class_names, threshold=0.75, min_disease_tiles=1, min_disease_fraction=0.0):
+    """
+    Summarize an (n_rows, n_cols, n_classes) grid of tile predictions.
+
+    Each tile is labelled with its top class when it clears `threshold`
+    ("Unknown Disease" otherwise). The diagnosis is the disease covering the
+    most confident tiles. A lesion visible in a few tiles outweighs healthy
+    leaf around it, but only once it covers at least `min_disease_tiles`
+    tiles and `min_disease_fraction` of all tiles (capped at the tile count),
+    so one noisy tile cannot turn a healthy field into a disease. Below that
+    a healthy class wins; a disease is still reported when nothing else
+    was recognised. Returns (disease_key, confidence, tile_map, counts,
+    disease_tiles), the last being the number of tiles with that label.
+    """
+
+    top = probs.argmax(axis=-1)
+    confidence = probs.max(axis=-1)
+    confident = confidence >= threshold
+
+    labels = np.array(class_names + ["Unknown Disease"], dtype=object)
+    tile_map = np.where(confident, top, len(class_names))
+    tile_map = labels[tile_map]
+
+    counts = {}
+    for label in tile_map.ravel():
+        counts[label] = counts.get(label, 0) + 1
+
+    def best(candidates):
+        candidates = [c for c in candidates if c in counts]
+        return max(candidates, key=lambda c: counts[c]) if candidates else None
+
+    required = min(tile_map.size, max(min_disease_tiles, math.ceil(min_disease_fraction * tile_map.size)))
+
+    diseases = [c for c in class_names if "healthy" not in c.lower()]
+    healthy = [c for c in class_names if "healthy" in c.lower()]
+    established = [c for c in diseases if counts.get(c, 0) >= required]
+    disease_key = best(established) or best(healthy) or best(diseases) or "Unknown Disease"
+
+    if disease_key == "Unknown Disease":
+        score = float(confidence.max())
+    else:
+        score = float(confidence[tile_map == disease_key].mean())
+
+    return disease_key, score, tile_map.tolist(), counts, counts.get(disease_key, 0)
@@ -0,0 +1,54 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import stage
+
+
+class UploadStore:
+    """
+    Optional, asynchronous archive of raw uploads.
+
+    Files are written by a single background thread under a collision-free
+    name, so the request path never waits on the filesystem. Once the folder
+    holds more than `max_files` uploads the oldest ones are removed.
+    """
+
+    def __init__(self, folder, max_files=1000):
+
+        self.folder = folder
+        self.max_files = max_files
+        self._writer = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="drcrop-uploads"
+        )
+
+        os.makedirs(self.folder, exist_ok=True)
+
+    def save_async(self, data, extension):
+        """Schedule `data` to be written and return the file name it will get."""
+
+        filename = f"{uuid.uuid4().hex}.{extension}"
+        self._writer.submit(self._write, filename, data)
+        return filename
+
+    def _write(self, filename, data):
+
+        try:
+            with stage("upload_save"), open(os.path.join(self.folder, filename), "wb") as f:
+                f.write(data)
+            self._prune()
+        except Exception as e:
+            print(f"Upload save error: {e}", flush=True)
+
+    def _prune(self):
+
+        if self.max_files <= 0:
+            return
+
+        entries = [e for e in os.scandir(self.folder) if e.is_file()]
+        if len(entries) <= self.max_files:
+            return
+
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            os.remove(entry.path)